@@ -0,0 +1,27 @@
+import base64
+import functools
+import os
+
+
+logo_path = "templates/assets/austunnel_logo.png"
+
+
+@functools.lru_cache(maxsize=None)
+def load_logo_data_uri(path=logo_path):
+    """
+    Return the company logo as a base64 data URI for embedding in the template.
+
+    The logo is a committed asset and is never fetched over the network. A
+    missing file is an error rather than a silently logo-less invoice; the
+    app checks for it at startup. The result is cached for the life of the
+    process (failures are not cached).
+
+    :param path: Path of the logo file.
+    :return: Data URI string.
+    :raises FileNotFoundError: If the logo file does not exist.
+    """
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"Company logo {path} is missing; it must be present to render invoices")
+    with open(path, "rb") as f:
+        encoded = base64.b64encode(f.read()).decode("ascii")
+    return f"data:image/png;base64,{encoded}"
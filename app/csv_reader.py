@@ -1,4 +1,6 @@
+import openpyxl as px
 import pandas as pd
+from app.uploads import detect_file_type
 
 
 class DataReader:
@@ -10,29 +12,213 @@ class DataReader:
         """
         self.file_path = file_path
 
-    def read_csv(self, skip_rows=1):
+    def detect_format(self):
+        """
+        Detect whether the file holds CSV text or an xlsx workbook, regardless
+        of its extension.
+
+        :return: "xlsx", "csv", or None if the contents are not recognised.
+        """
+        with open(self.file_path, "rb") as f:
+            return detect_file_type(f.read(8192))
+
+    def read_table(self, skip_rows=0, columns=None, sheet_name=None, dtypes=None):
+        """
+        Read a table from a CSV file or an xlsx workbook, whichever the file contains.
+
+        :param skip_rows: Number of rows to skip before the header row.
+        :param columns: Optional list of columns to keep; other columns are
+            not loaded. Missing columns are ignored.
+        :param sheet_name: Worksheet to read from a workbook; the first
+            worksheet is used when it is None or not present.
+        :param dtypes: Optional dictionary mapping columns to the dtype they
+            are read as instead of the inferred one. Missing columns are ignored.
+        :return: Pandas DataFrame, or an error message string.
+        """
+        file_format = self.detect_format()
+        if file_format == "xlsx":
+            return self.read_excel(sheet_name=sheet_name, skip_rows=skip_rows, columns=columns, dtypes=dtypes)
+        return self.read_csv(skip_rows=skip_rows, columns=columns, dtypes=dtypes)
+
+    def iter_chunks(self, chunk_size, skip_rows=0, columns=None, sheet_name=None, dtypes=None):
+        """
+        Read a table from a CSV file or an xlsx workbook in chunks of rows,
+        so that only one chunk is held in memory at a time.
+
+        Dtypes are inferred per chunk, so columns whose type depends on their
+        values (e.g. whole numbers without blanks becoming int64) should be
+        given in dtypes to be read the same way in every chunk and by read_table.
+
+        :param chunk_size: Number of data rows per chunk.
+        :param skip_rows: Number of rows to skip before the header row.
+        :param columns: Optional list of columns to keep.
+        :param sheet_name: Worksheet to read from a workbook (see read_table).
+        :param dtypes: Optional dictionary mapping columns to their dtype (see read_table).
+        :return: Iterator of DataFrames, or an error message string if the
+            file cannot be opened. Errors found while iterating (a corrupt
+            workbook, a bad value in a later chunk) are raised as ValueError
+            with the same message.
+        """
+        try:
+            if self.detect_format() == "xlsx":
+                chunks = self.iter_excel_chunks(chunk_size, sheet_name, skip_rows, columns, dtypes)
+            else:
+                usecols = None if columns is None else (lambda column: column in columns)
+                chunks = pd.read_csv(
+                    self.file_path, skiprows=skip_rows, usecols=usecols, dtype=dtypes, chunksize=chunk_size
+                )
+        except Exception as e:
+            return f"Error reading table: {str(e)}"
+        return self.raise_read_errors(chunks)
+
+    @staticmethod
+    def raise_read_errors(chunks):
+        try:
+            yield from chunks
+        except Exception as e:
+            raise ValueError(f"Error reading table: {str(e)}") from e
+
+    def iter_excel_chunks(self, chunk_size, sheet_name=None, skip_rows=0, columns=None, dtypes=None):
+        with open(self.file_path, "rb") as f:
+            workbook = px.load_workbook(f, read_only=True, data_only=True)
+            try:
+                worksheet = self.select_worksheet(workbook, sheet_name)
+                yield from self.rows_to_frames(
+                    worksheet.iter_rows(values_only=True), skip_rows, columns, chunk_size, dtypes
+                )
+            finally:
+                workbook.close()
+
+    @staticmethod
+    def select_worksheet(workbook, sheet_name):
+        if sheet_name in workbook.sheetnames:
+            worksheet = workbook[sheet_name]
+        else:
+            worksheet = workbook.worksheets[0]
+        # Exports often carry a stale dimension record; read until the last row instead
+        worksheet.reset_dimensions()
+        return worksheet
+
+    def read_csv(self, skip_rows=1, columns=None, dtypes=None):
         """
         Reads a CSV file and returns a Pandas DataFrame.
 
         :param skip_rows: Number of rows to skip from the beginning of the file.
+        :param columns: Optional list of columns to keep.
+        :param dtypes: Optional dictionary mapping columns to their dtype.
         :return: Pandas DataFrame containing the CSV data.
         """
         try:
-            data = pd.read_csv(self.file_path, skiprows=skip_rows)
+            usecols = None if columns is None else (lambda column: column in columns)
+            data = pd.read_csv(self.file_path, skiprows=skip_rows, usecols=usecols, dtype=dtypes)
             return data
         except Exception as e:
             return f"Error reading CSV: {str(e)}"
 
-    def read_excel(self, sheet_name=None, skip_rows=1):
+    def sheet_names(self):
+        """
+        :return: Worksheet names of the workbook, read without loading any cells.
         """
-        Reads an Excel file and returns a Pandas DataFrame.
+        with open(self.file_path, "rb") as f:
+            workbook = px.load_workbook(f, read_only=True)
+            try:
+                return workbook.sheetnames
+            finally:
+                workbook.close()
+
+    def read_excel(self, sheet_name=None, skip_rows=1, columns=None, dtypes=None):
+        """
+        Reads an Excel worksheet and returns a Pandas DataFrame.
+
+        The workbook is opened in read-only mode and rows are streamed as
+        plain values, so no cell objects are kept in memory; only the
+        selected columns are collected.
 
-        :param sheet_name: Name of the sheet to read from (default is None).
+        :param sheet_name: Name of the sheet to read from; the first sheet is
+            used when it is None or not present.
         :param skip_rows: Number of rows to skip from the beginning of the sheet.
+        :param columns: Optional list of columns to keep.
+        :param dtypes: Optional dictionary mapping columns to their dtype.
         :return: Pandas DataFrame containing the Excel data.
         """
         try:
-            data = pd.read_excel(self.file_path, sheet_name=sheet_name, skiprows=skip_rows)
-            return data
+            # Opened from a file object so the workbook is read whatever its extension
+            with open(self.file_path, "rb") as f:
+                workbook = px.load_workbook(f, read_only=True, data_only=True)
+                try:
+                    worksheet = self.select_worksheet(workbook, sheet_name)
+                    return self.rows_to_frame(worksheet.iter_rows(values_only=True), skip_rows, columns, dtypes)
+                finally:
+                    workbook.close()
         except Exception as e:
             return f"Error reading XLSX: {str(e)}"
+
+    @staticmethod
+    def rows_to_frame(rows, skip_rows=0, columns=None, dtypes=None):
+        """
+        Collect streamed row tuples into typed DataFrame columns.
+
+        :param rows: Iterator of row value tuples, e.g. from iter_rows(values_only=True).
+        :param skip_rows: Number of rows to skip before the header row.
+        :param columns: Optional list of columns to keep.
+        :param dtypes: Optional dictionary mapping columns to their dtype.
+        :return: DataFrame; empty rows are dropped and each column not in
+            dtypes gets the dtype pandas infers from its values (float64
+            with NaN for numbers with blanks, as read_csv does).
+        """
+        return next(DataReader.rows_to_frames(rows, skip_rows, columns, dtypes=dtypes))
+
+    @staticmethod
+    def rows_to_frames(rows, skip_rows=0, columns=None, chunk_size=None, dtypes=None):
+        """
+        Like rows_to_frame, but yield a DataFrame every chunk_size data rows.
+
+        :param chunk_size: Number of data rows per DataFrame, or None for a single DataFrame.
+        :return: Generator of DataFrames; at least one (possibly empty) is yielded.
+        """
+        rows = iter(rows)
+        for _ in range(skip_rows):
+            next(rows, None)
+        header = next(rows, None) or ()
+        names = []
+        for position, name in enumerate(header):
+            name = f"Unnamed: {position}" if name is None else str(name)
+            # Repeated headers get a ".1", ".2", ... suffix, as read_csv does
+            base, count = name, 0
+            while name in names:
+                count += 1
+                name = f"{base}.{count}"
+            names.append(name)
+        header = names
+
+        selected = [
+            (position, name) for position, name in enumerate(header)
+            if columns is None or name in columns
+        ]
+
+        dtypes = dtypes or {}
+
+        def to_frame(values):
+            return pd.DataFrame({
+                name: pd.Series(column_values, dtype=dtypes.get(name))
+                for name, column_values in values.items()
+            })
+
+        values = {name: [] for _, name in selected}
+        count = 0
+        yielded = False
+        for row in rows:
+            picked = [row[position] if position < len(row) else None for position, _ in selected]
+            if all(value is None for value in picked):
+                continue
+            for (_, name), value in zip(selected, picked):
+                values[name].append(value)
+            count += 1
+            if chunk_size and count == chunk_size:
+                yield to_frame(values)
+                yielded = True
+                values = {name: [] for _, name in selected}
+                count = 0
+
+        if count or not yielded:
+            yield to_frame(values)
@@ -0,0 +1,100 @@
+import fcntl
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+def file_digest(file_path, chunk_size=1024 * 1024):
+    """
+    Compute the SHA-256 digest of a file.
+
+    :param file_path: Path of the file to hash.
+    :param chunk_size: Number of bytes read per chunk.
+    :return: Hex digest of the file contents.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def frame_fingerprint(df, *extra):
+    """
+    Compute a stable SHA-256 fingerprint of a DataFrame's columns and values.
+
+    :param df: DataFrame to fingerprint.
+    :param extra: Additional strings that should change the fingerprint.
+    :return: Hex digest.
+    """
+    # Imported here so the fingerprint store can be used without loading pandas
+    import pandas as pd
+
+    digest = hashlib.sha256()
+    digest.update(json.dumps([str(column) for column in df.columns]).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    for part in extra:
+        digest.update(str(part).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class FingerprintStore:
+    def __init__(self, file_path="state/cost_centre_fingerprints.json"):
+        """
+        Persistent map of cost centre -> fingerprint of its last delivered inputs.
+
+        Updates hold an exclusive flock on "<file_path>.lock", so worker
+        processes sharing the file do not overwrite each other's entries.
+
+        :param file_path: JSON file the fingerprints are kept in.
+        """
+        self.file_path = file_path
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self):
+        directory = os.path.dirname(self.file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock, open(f"{self.file_path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self):
+        try:
+            with open(self.file_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def load(self):
+        """
+        :return: Dictionary mapping cost centres to their stored fingerprint.
+        """
+        with self._lock:
+            return {cost_centre: entry["fingerprint"] for cost_centre, entry in self._load().items()}
+
+    def update(self, fingerprints, run_id):
+        """
+        Record the fingerprints of cost centres delivered by a run.
+
+        :param fingerprints: Dictionary mapping cost centres to fingerprints.
+        :param run_id: Identifier of the run that delivered them.
+        """
+        if not fingerprints:
+            return
+        with self._locked():
+            entries = self._load()
+            now = time.time()
+            for cost_centre, fingerprint in fingerprints.items():
+                entries[cost_centre] = {"fingerprint": fingerprint, "run_id": run_id, "updated_at": now}
+            tmp_path = f"{self.file_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(entries, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.file_path)
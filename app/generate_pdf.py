@@ -1,108 +1,418 @@
 import os
+import signal
+import subprocess
 import pandas as pd
 import pdfkit
+from datetime import datetime
 from jinja2 import Environment, FileSystemLoader
-from concurrent.futures import ThreadPoolExecutor
+from app.assets import load_logo_data_uri
+from app.line_store import invoice_suffix, load_invoice_lines, round_2dp
+from app.matcher import OrganizationMatchError
+from app.money import cents_to_dollars, format_cents, gst_cents
+from app.reference_data import reference_data
+from app.render_pool import RenderScheduler
 
 
-csv_data_directory = "./data"
-csv_file_name = "clients_and_projects.csv"
-clients_data = "map_clients.csv"
-organizations_data = "organizations.csv"
+template_env = Environment(loader=FileSystemLoader("."))
+template_name = "templates/template.html"
 
+# The template has no scripts or remote resources; JavaScript is off and every
+# network request goes to an unreachable local proxy so it fails immediately.
+pdf_options = {
+    "disable-javascript": None,
+    "proxy": "http://127.0.0.1:9",
+    "load-media-error-handling": "ignore",
+}
 
-def partial_match(row, organizations_df):
+
+def split_address(address):
+    """
+    Split a comma separated client address into the invoice address lines.
+
+    :param address: Address string, e.g. "Level 9, 180 Flinders Street, Melbourne, VIC 3000".
+    :return: Dictionary with "full_address", "level", "city" and "state_postal_code".
     """
-    Perform a partial match on "Payroll Name" and "Contract Entity" columns.
+    address = "" if pd.isna(address) else str(address)
+    parts = address.split(", ")
+    while parts and parts[-1] in ("", "undefined"):
+        parts.pop()
+    parts += [""] * (5 - len(parts))
+    return {
+        "full_address": parts[0],
+        "level": parts[1],
+        "city": parts[2],
+        "state_postal_code": f"{parts[3]} {parts[4]}",
+    }
 
-    :param row: DataFrame row containing "Payroll Name" to match.
-    :param organizations_df: DataFrame containing "Contract Entity" for matching.
-    :return: Matching row from organizations_df.
+
+def html_to_pdf(html, pdf_output, timeout=None, options=None):
     """
-    cleaned_payroll_name = row["Payroll Name"].replace(" ", "").lower()
-    cleaned_contract_entity = organizations_df["Contract Entity"].str.replace(" ", "").str.lower()
-    matching_rows = organizations_df[cleaned_contract_entity.str.contains(cleaned_payroll_name, case=False, regex=False)]
-    return matching_rows.iloc[0]
+    Convert HTML to a PDF file with wkhtmltopdf.
+
+    Builds the same command line as pdfkit.from_string but runs it with a
+    timeout, so a hung wkhtmltopdf process is killed instead of blocking a
+    render worker forever.
+
+    :param html: HTML string to convert.
+    :param pdf_output: Path of the PDF file to write.
+    :param timeout: Seconds to wait for wkhtmltopdf (None waits indefinitely).
+    :param options: Optional dictionary of wkhtmltopdf options.
+    :raises TimeoutError: If wkhtmltopdf does not finish within timeout.
+    :raises IOError: If wkhtmltopdf fails.
+    """
+    kit = pdfkit.PDFKit(html, "string", options=options)
+    args = kit.command(pdf_output)
+    process = subprocess.Popen(
+        args,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        start_new_session=os.name == "posix",
+    )
+    try:
+        stdout, stderr = process.communicate(input=html.encode("utf-8"), timeout=timeout)
+    except subprocess.TimeoutExpired:
+        # Kill the whole process group so helper processes do not outlive the render
+        if os.name == "posix":
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+        process.communicate()
+        raise TimeoutError(f"wkhtmltopdf did not finish within {timeout} seconds")
+
+    stderr = (stderr or stdout or b"").decode("utf-8", errors="replace")
+    kit.handle_error(process.returncode, stderr)
+    if not os.path.exists(pdf_output) or not os.path.getsize(pdf_output):
+        raise IOError(f"wkhtmltopdf did not write {pdf_output}: {stderr}")
+
+
+class InvoiceLine:
+    __slots__ = ("serviced", "description", "unit", "rate", "amount")
+
+    def __init__(self, serviced, description, unit, rate, amount):
+        self.serviced = serviced
+        self.description = description
+        self.unit = unit
+        self.rate = rate
+        self.amount = amount
+
+
+class EmployeeGroup:
+    __slots__ = ("given_names", "last_name", "lines")
+
+    def __init__(self, given_names, last_name):
+        self.given_names = given_names
+        self.last_name = last_name
+        self.lines = []
+
+
+def invoice_totals(amount_cents):
+    """
+    Compute the totals of an invoice in whole cents.
+
+    The PDF and the webhook summary both use these figures, so they always
+    agree to the cent.
+
+    :param amount_cents: int64 Series of line amounts in cents.
+    :return: Dictionary with "subtotal", "gst" and "grand_total" in cents.
+    """
+    subtotal = int(amount_cents.sum())
+    gst = gst_cents(subtotal)
+    return {"subtotal": subtotal, "gst": gst, "grand_total": subtotal + gst}
+
+
+def build_employee_groups(data):
+    """
+    Group consecutive invoice lines by employee in a single pass.
+
+    :param data: Invoice lines DataFrame, sorted by employee.
+    :return: List of EmployeeGroup objects in invoice order.
+    """
+    groups = []
+    current = None
+    columns = [data[column].tolist() for column in
+               ["Given Names", "Last Name", "Serviced", "Description", "Unit", "Rate", "Amount"]]
+
+    for given_names, last_name, serviced, description, unit, rate, amount in zip(*columns):
+        if current is None or (given_names, last_name) != (current.given_names, current.last_name):
+            current = EmployeeGroup(given_names, last_name)
+            groups.append(current)
+        current.lines.append(InvoiceLine(serviced, description, unit, rate, amount))
+
+    return groups
+
+
+class InvoiceSummary:
+    __slots__ = ("invoice_file", "cost_centre", "totals", "organization", "client_name", "pdf_path")
+
+    def __init__(self, invoice_file, cost_centre, totals, organization, client_name, pdf_path):
+        """
+        Webhook summary of one generated invoice.
+
+        :param invoice_file: Name of the input .npy invoice file.
+        :param cost_centre: Cost Centre of the invoice.
+        :param totals: Invoice totals in cents, as returned by invoice_totals.
+        :param organization: Matched organizations.csv row as a dictionary.
+        :param client_name: "Search Entity" of the cost centre's client.
+        :param pdf_path: Path of the generated PDF.
+        """
+        self.invoice_file = invoice_file
+        self.cost_centre = cost_centre
+        self.totals = totals
+        self.organization = organization
+        self.client_name = client_name
+        self.pdf_path = pdf_path
+
+    @property
+    def total_amount(self):
+        """
+        :return: Invoice subtotal in dollars (excluding GST), the PDF subtotal.
+        """
+        return cents_to_dollars(self.totals["subtotal"])
+
+    def to_record(self):
+        """
+        :return: The invoice's entry in the webhook "data" list.
+        """
+        return {
+            "total_amount": self.total_amount,
+            "filtered_data": self.organization,
+            "client_name": self.client_name,
+        }
+
+    def pdf_file(self):
+        """
+        :return: (file name, file path, content type) of the PDF for the webhook.
+        """
+        return os.path.basename(self.pdf_path), self.pdf_path, "application/pdf"
+
+    def manifest_entry(self):
+        """
+        :return: The invoice's entry for InvoiceManifest.record.
+        """
+        return {
+            "pdf_file": os.path.basename(self.pdf_path),
+            "cost_centre": self.cost_centre,
+            "invoice_file": self.invoice_file,
+            "pdf_path": self.pdf_path,
+            "subtotal_cents": self.totals["subtotal"],
+            "gst_cents": self.totals["gst"],
+            "grand_total_cents": self.totals["grand_total"],
+        }
 
 
 class InvoiceProcessor:
-    def __init__(self, invoice_folder, output_folder):
+    def __init__(self, invoice_folder, output_folder, max_workers=None, render_timeout=None,
+                 pdf_cache=None, pdf_renderer=None):
         """
         Initialize the InvoiceProcessor with input and output folders.
 
         :param invoice_folder: Folder containing input invoice files.
         :param output_folder: Folder to store generated PDFs.
+        :param max_workers: Number of PDFs rendered concurrently (defaults to the CPU count).
+        :param render_timeout: Seconds a single wkhtmltopdf run may take before it is killed.
+        :param pdf_cache: Optional PdfCache used to reuse PDFs of unchanged invoices.
+        :param pdf_renderer: Callable taking (html, pdf_output, timeout=, options=) that
+            writes the PDF; defaults to html_to_pdf (wkhtmltopdf).
         """
         self.invoice_folder = invoice_folder
         self.output_folder = output_folder
+        self.render_timeout = render_timeout
+        self.pdf_cache = pdf_cache
+        self.pdf_renderer = pdf_renderer
+        self.scheduler = RenderScheduler(max_workers=max_workers)
+        self._summaries = {}
+
+    def pdf_path(self, invoice_file):
+        """
+        :param invoice_file: Name of the input .npy invoice file.
+        :return: Path of the PDF generated for the invoice.
+        """
+        return os.path.join(self.output_folder, os.path.splitext(invoice_file)[0] + ".pdf")
+
+    def load_lines(self, invoice_file):
+        """
+        :param invoice_file: Name of the input .npy invoice file.
+        :return: DataFrame of the invoice's lines.
+        """
+        return load_invoice_lines(os.path.join(self.invoice_folder, invoice_file))
+
+    def summarise(self, invoice_file, lines):
+        """
+        Build the webhook summary of an invoice from its already loaded lines.
+
+        All payroll names must match an organization; the first line's match
+        is reported. The client is looked up by the lines' Cost Centre.
+
+        :param invoice_file: Name of the input .npy invoice file.
+        :param lines: DataFrame of all the invoice's lines.
+        :return: InvoiceSummary, or None if the invoice has no lines or a
+            payroll name has no matching organization.
+        """
+        try:
+            matching_rows_df = reference_data.matcher().match_many(lines["Payroll Name"])
+        except OrganizationMatchError as e:
+            print(f"No summary for {invoice_file}: {e}")
+            return None
+        if matching_rows_df.empty:
+            return None
+
+        cost_centre = lines["Cost Centre"].iloc[0]
+        return InvoiceSummary(
+            invoice_file,
+            cost_centre,
+            invoice_totals(lines["Amount Cents"]),
+            matching_rows_df.iloc[0].to_dict(),
+            reference_data.client_for(cost_centre)["Search Entity"],
+            self.pdf_path(invoice_file),
+        )
+
+    def preview(self, invoice_file, lines=None, include_html=False):
+        """
+        Summarise an invoice without producing its PDF.
+
+        Totals come from invoice_totals and the HTML from render_html, so a
+        preview shows exactly what the PDF would.
+
+        :param invoice_file: Name of the input .npy invoice file.
+        :param lines: DataFrame of the invoice's lines, if already loaded.
+        :param include_html: Also render the invoice HTML.
+        :return: Dictionary with the cost centre, line count, subtotal, GST and
+            grand total in dollars, the matched organization and client name,
+            an "error" message if either lookup fails, and the "html" if requested.
+        """
+        lines = self.load_lines(invoice_file) if lines is None else lines
+        totals = invoice_totals(lines["Amount Cents"])
+        preview = {
+            "invoice_file": invoice_file,
+            "cost_centre": lines["Cost Centre"].iloc[0] if len(lines) else invoice_file[:-len(invoice_suffix)],
+            "lines": len(lines),
+            **{name: cents_to_dollars(cents) for name, cents in totals.items()},
+            "organization": None,
+            "client_name": None,
+            "error": None,
+            "html": None,
+        }
+        if not len(lines):
+            return preview
+        try:
+            organization = reference_data.matcher().match_many(lines["Payroll Name"]).iloc[0]
+            preview["organization"] = organization.astype(object).where(organization.notna(), None).to_dict()
+            preview["client_name"] = reference_data.client_for(preview["cost_centre"])["Search Entity"]
+            if include_html:
+                preview["html"] = self.render_html(invoice_file, lines)
+        except OrganizationMatchError as e:
+            preview["error"] = str(e)
+        except KeyError as e:
+            # Unmapped cost centre; KeyError quotes its message, so take the raw argument
+            preview["error"] = str(e.args[0])
+        return preview
+
+    def render_html(self, invoice_file, lines=None):
+        """
+        Render the HTML invoice for an invoice line file.
+
+        :param invoice_file: Name of the input .npy invoice file.
+        :param lines: DataFrame of the invoice's lines, if already loaded.
+        :return: Rendered HTML string.
+        """
+        # Load the typed invoice lines and preprocess
+        data = self.load_lines(invoice_file) if lines is None else lines
+        data = data[data["Amount Cents"] != 0].copy()
+        for column in ["Unit", "Rate"]:
+            data[column] = round_2dp(data[column])
+        data["Amount"] = data["Amount Cents"].map(format_cents)
+
+        # Totals are computed in cents and only formatted here
+        totals = {name: format_cents(cents) for name, cents in invoice_totals(data["Amount Cents"]).items()}
+
+        # Prepare data for rendering
+        groups = build_employee_groups(data)
+
+        # Load Jinja2 template (compiled once and cached by the environment)
+        template = template_env.get_template(template_name)
+
+        # Look up the client and organization from the cached reference data
+        cost_centre = invoice_file.split("_")
+        invoice_info = reference_data.client_for(cost_centre[0])
+
+        # Perform partial match and render HTML
+        additional_info = reference_data.matcher().first_match(data["Payroll Name"])
+        additional_info = additional_info.rename(index=str.strip)
+        return template.render(groups=groups,
+                               totals=totals,
+                               additional_info=additional_info,
+                               invoice_info=invoice_info,
+                               address=split_address(invoice_info["Address"]),
+                               invoice_date=datetime.now().strftime("%m/%d/%Y"),
+                               logo=load_logo_data_uri())
 
     def generate_pdf(self, invoice_file):
         """
-        Generate a PDF invoice from a CSV file.
+        Generate a PDF invoice from an invoice line file.
+
+        The rendered HTML already contains every input of the PDF (line rows,
+        matched organization and client records, template and invoice date),
+        so its fingerprint is used as the PDF cache key. Once the PDF exists,
+        the invoice's webhook summary is built from the same loaded lines.
 
-        :param invoice_file: Name of the input CSV invoice file.
+        :param invoice_file: Name of the input .npy invoice file.
+        :return: True if the PDF was reused from the cache, False if it was rendered.
+        :raises Exception: If rendering fails or wkhtmltopdf exceeds render_timeout.
         """
         try:
-            # Read CSV data and preprocess
-            data = pd.read_csv(os.path.join(self.invoice_folder, invoice_file), header=[0])
-            data = data[data["Amount"] != 0]
-            data["Amount"] = data["Amount"].apply(lambda x: "{:.2f}".format(float(x)) if x else "0.00")
-
-            # Calculate totals
-            subtotal = data["Amount"].astype(float).sum()
-            gst_rate = 0.10
-            gst = float(subtotal) * gst_rate
-            subtotal, gst = "{:.2f}".format(subtotal), "{:.2f}".format(gst)
-            grand_total = float(subtotal) + float(gst)
-            totals = {"subtotal": subtotal, "gst": gst, "grand_total": "{:.2f}".format(grand_total)}
-
-            # Prepare data for rendering
-            result_df_with_blanks = pd.DataFrame()
-            current_given_names = None
-            blank_row = {"Serviced": "", "Description": "", "Unit": "", "Rate": "", "Amount": ""}
-
-            for index, row in data.iterrows():
-                given_names = row["Given Names"]
-                if current_given_names is None or given_names != current_given_names:
-                    result_df_with_blanks = pd.concat([result_df_with_blanks, pd.DataFrame(blank_row, index=[0])])
-                result_df_with_blanks = pd.concat([result_df_with_blanks, pd.DataFrame(row).T])
-                current_given_names = given_names
-
-            # Load Jinja2 template
-            env = Environment(loader=FileSystemLoader("."))
-            template = env.get_template("templates/template.html")
-
-            # Load CSV data for matching
-            organization_file_path = os.path.join(csv_data_directory, organizations_data)
-            clients_file_path = os.path.join(csv_data_directory, clients_data)
-            organizations_df = pd.read_csv(organization_file_path)
-            clients_df = pd.read_csv(clients_file_path)
-            cost_centre = invoice_file.split("_")
-            filtered_data = clients_df[clients_df["Cost Centre"] == cost_centre[0]]
-
-            # Perform partial match and render HTML
-            organizations_df.columns = organizations_df.columns.str.strip()
-            matching_rows_df = data.apply(partial_match, axis=1, organizations_df=organizations_df)
-            rendered_html = template.render(data=result_df_with_blanks,
-                                           totals=totals,
-                                           additional_info=matching_rows_df.iloc[0],
-                                           invoice_info=filtered_data.iloc[0])
-
-            # Define output PDF file name based on the current invoice file
-            pdf_output = os.path.join(self.output_folder, os.path.splitext(invoice_file)[0] + ".pdf")
-
-            # Use pdfkit to generate PDF from rendered HTML
-            pdfkit.from_string(rendered_html, pdf_output)
-            print(f"PDF generated successfully for {invoice_file}")
+            lines = self.load_lines(invoice_file)
+            rendered_html = self.render_html(invoice_file, lines)
+
+            pdf_output = self.pdf_path(invoice_file)
+
+            cached = False
+            cache_key = None
+            if self.pdf_cache is not None:
+                cache_key = self.pdf_cache.fingerprint(rendered_html, repr(sorted(pdf_options.items())))
+                cached = self.pdf_cache.fetch(cache_key, pdf_output)
+
+            if cached:
+                print(f"PDF reused from cache for {invoice_file}")
+            else:
+                render = self.pdf_renderer or html_to_pdf
+                render(rendered_html, pdf_output, timeout=self.render_timeout, options=pdf_options)
+                if cache_key is not None:
+                    self.pdf_cache.store(cache_key, pdf_output)
+                print(f"PDF generated successfully for {invoice_file}")
+
+            self._summaries[invoice_file] = self.summarise(invoice_file, lines)
+            return cached
 
         except Exception as e:
             print(f"Error generating PDF for {invoice_file}: {e}")
+            raise
 
     def process_invoices(self):
         """
-        Process all CSV invoices in the specified folder using ThreadPoolExecutor.
+        Render all invoices in the specified folder on the worker pool.
+
+        :return: List of RenderResult objects, one per invoice.
         """
-        invoice_files = [f for f in os.listdir(self.invoice_folder) if f.endswith("_invoice.csv")]
+        invoice_files = sorted(f for f in os.listdir(self.invoice_folder) if f.endswith(invoice_suffix))
+        results = self.scheduler.run(self.generate_pdf, invoice_files)
+        for result in results:
+            if result.success:
+                result.pdf_bytes = os.path.getsize(self.pdf_path(result.invoice_file))
+        if self.pdf_cache is not None:
+            self.pdf_cache.evict()
+        return results
 
-        with ThreadPoolExecutor(max_workers=1) as executor:  # Adjust max_workers as needed
-            executor.map(self.generate_pdf, invoice_files)
+    def summaries(self, results):
+        """
+        Collect the webhook summaries of successfully generated invoices.
+
+        :param results: List of RenderResult objects returned by process_invoices.
+        :return: List of InvoiceSummary objects in result order.
+        """
+        summaries = []
+        for result in results:
+            summary = self._summaries.get(result.invoice_file) if result.success else None
+            if summary is not None:
+                summaries.append(summary)
+        return summaries
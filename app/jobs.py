@@ -0,0 +1,210 @@
+import json
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+
+class QueueFullError(RuntimeError):
+    """
+    Raised when a job is submitted while the queue is at capacity.
+    """
+
+
+@contextmanager
+def track_stage(progress, stage):
+    """
+    Report a stage as running, then done or failed, through a progress callback.
+
+    :param progress: Callable taking (stage, status), or None to skip reporting.
+    :param stage: Stage name.
+    """
+    if progress is None:
+        yield
+        return
+    progress(stage, "running")
+    try:
+        yield
+    except BaseException:
+        progress(stage, "failed")
+        raise
+    progress(stage, "done")
+
+
+class Job:
+    def __init__(self, job_id, stages, details=None):
+        """
+        State of a single background job.
+
+        :param job_id: Unique job identifier.
+        :param stages: Ordered list of stage names reported by the job.
+        :param details: Optional dictionary of extra information reported with the status.
+        """
+        self.id = job_id
+        self.details = details or {}
+        self.status = "queued"
+        self.stages = {stage: {"status": "pending", "duration": None} for stage in stages}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.future = None
+        self._stage_started = {}
+        self._lock = threading.Lock()
+
+    def set_stage(self, stage, status):
+        """
+        Record progress of a stage.
+
+        :param stage: Stage name.
+        :param status: "running", "done" or "failed".
+        """
+        with self._lock:
+            entry = self.stages.setdefault(stage, {"status": "pending", "duration": None})
+            entry["status"] = status
+            if status == "running":
+                self._stage_started[stage] = time.perf_counter()
+            elif stage in self._stage_started:
+                entry["duration"] = round(time.perf_counter() - self._stage_started.pop(stage), 3)
+
+    @classmethod
+    def from_dict(cls, state):
+        """
+        Restore a Job saved by JobManager, e.g. by another worker process.
+
+        :param state: Dictionary produced by to_dict(), plus the "result" key.
+        :return: Job instance.
+        """
+        job = cls(state["job_id"], [], state.get("details"))
+        job.status = state["status"]
+        job.stages = state["stages"]
+        job.error = state.get("error")
+        job.result = state.get("result")
+        job.created_at = state["created_at"]
+        job.started_at = state.get("started_at")
+        job.finished_at = state.get("finished_at")
+        return job
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "stages": {stage: dict(entry) for stage, entry in self.stages.items()},
+                "error": self.error,
+                "details": self.details,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+            }
+
+
+class JobManager:
+    def __init__(self, max_workers=1, max_queued=20, retention=24 * 3600, state_path=None):
+        """
+        Run jobs on a bounded thread pool and keep their state for polling.
+
+        :param max_workers: Number of jobs executed concurrently.
+        :param max_queued: Maximum number of unfinished (queued or running) jobs.
+        :param retention: Seconds a finished job stays available for polling in memory.
+        :param state_path: Optional callable mapping a job id to a JSON file path.
+            Job state is saved there on every update, so it can be polled from
+            any worker process that shares the file system.
+        """
+        self.max_queued = max_queued
+        self.retention = retention
+        self.state_path = state_path
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args, stages=(), job_id=None, details=None, **kwargs):
+        """
+        Queue func(*args, progress=job.set_stage, **kwargs) for execution.
+
+        :param func: Callable doing the work; its return value becomes the job result.
+        :param stages: Stage names func reports through its progress callback.
+        :param job_id: Optional job identifier; a random one is generated by default.
+        :param details: Optional dictionary of extra information reported with the status.
+        :return: The queued Job.
+        :raises QueueFullError: If max_queued unfinished jobs already exist.
+        """
+        with self._lock:
+            self._prune()
+            unfinished = sum(job.finished_at is None for job in self._jobs.values())
+            if unfinished >= self.max_queued:
+                raise QueueFullError(f"Job queue is full ({unfinished} unfinished jobs)")
+            job = Job(job_id or uuid.uuid4().hex, stages, details)
+            self._jobs[job.id] = job
+
+        def progress(stage, status):
+            job.set_stage(stage, status)
+            self._save(job)
+
+        def run():
+            job.status = "running"
+            job.started_at = time.time()
+            self._save(job)
+            try:
+                job.result = func(*args, progress=progress, **kwargs)
+                job.status = "succeeded"
+                return job.result
+            except Exception as e:
+                job.error = str(e) or type(e).__name__
+                job.status = "failed"
+                traceback.print_exc()
+                raise
+            finally:
+                job.finished_at = time.time()
+                self._save(job)
+
+        self._save(job)
+        job.future = self._executor.submit(run)
+        return job
+
+    def unfinished_ids(self):
+        """
+        :return: Set of the ids of queued and running jobs.
+        """
+        with self._lock:
+            return {job_id for job_id, job in self._jobs.items() if job.finished_at is None}
+
+    def _save(self, job):
+        path = self.state_path(job.id) if self.state_path else None
+        if not path:
+            return
+        state = job.to_dict()
+        state["result"] = job.result
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f, default=str)
+        os.replace(tmp_path, path)
+
+    def get(self, job_id):
+        """
+        :param job_id: Job identifier returned by submit().
+        :return: The Job, or None if it is unknown or has expired.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None or not self.state_path:
+            return job
+
+        path = self.state_path(job_id)
+        if not path or not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return Job.from_dict(json.load(f))
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_at is not None and job.finished_at < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+
+invoice_suffix = "_invoice.npy"
+
+
+def round_2dp(values):
+    """
+    Round values to two decimals exactly as the "%.2f" CSV export does.
+
+    A float64 times 100 is exact in an extended long double (64-bit
+    mantissa), so rint rounds the true binary value, ties to even, like
+    "%.2f". Where long double is no wider than float64 the values are
+    formatted one by one instead.
+
+    :param values: Series of floats.
+    :return: Series of rounded floats.
+    """
+    if np.finfo(np.longdouble).nmant < 60:
+        return values.map("{:.2f}".format).astype(float)
+    hundredths = np.rint(values.to_numpy(dtype=np.longdouble) * 100).astype(float)
+    return pd.Series(hundredths / 100, index=values.index, name=values.name)
+
+
+def record_dtype(df):
+    """
+    Build the structured NumPy dtype for a DataFrame of invoice lines.
+
+    Integer columns (amounts in cents) are stored as int64, other numeric
+    columns as float64 and every other column as a fixed-width unicode
+    string sized to its longest value, so the records can be memory-mapped
+    without any text parsing.
+
+    :param df: DataFrame of invoice lines.
+    :return: numpy.dtype with one field per column.
+    """
+    fields = []
+    for column in df.columns:
+        if pd.api.types.is_integer_dtype(df[column]):
+            fields.append((column, "i8"))
+        elif pd.api.types.is_numeric_dtype(df[column]):
+            fields.append((column, "f8"))
+        else:
+            width = int(df[column].astype(str).str.len().max()) if len(df) else 0
+            fields.append((column, f"U{max(width, 1)}"))
+    return np.dtype(fields)
+
+
+def save_invoice_lines(df, file_path):
+    """
+    Write invoice lines to a .npy file of structured records.
+
+    :param df: DataFrame of invoice lines.
+    :param file_path: Path of the .npy file to write.
+    """
+    dtype = record_dtype(df)
+    records = np.empty(len(df), dtype=dtype)
+    for column in df.columns:
+        values = df[column].to_numpy()
+        records[column] = values if dtype[column].kind in "fi" else values.astype(str)
+    np.save(file_path, records, allow_pickle=False)
+
+
+def load_invoice_lines(file_path, mmap=True):
+    """
+    Load invoice lines written by save_invoice_lines.
+
+    :param file_path: Path of the .npy file.
+    :param mmap: Memory-map the file instead of reading it into memory.
+    :return: DataFrame with int64, float64 and string columns.
+    """
+    records = np.load(file_path, mmap_mode="r" if mmap else None, allow_pickle=False)
+    return pd.DataFrame({name: records[name] for name in records.dtype.names})
@@ -0,0 +1,188 @@
+import os
+import sqlite3
+import time
+from contextlib import closing
+from app.fingerprints import file_digest
+
+
+schema = """
+CREATE TABLE IF NOT EXISTS invoices (
+    run_id TEXT NOT NULL,
+    pdf_file TEXT NOT NULL,
+    cost_centre TEXT NOT NULL,
+    invoice_file TEXT NOT NULL,
+    pdf_path TEXT NOT NULL,
+    subtotal_cents INTEGER NOT NULL,
+    gst_cents INTEGER NOT NULL,
+    grand_total_cents INTEGER NOT NULL,
+    pdf_bytes INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (run_id, pdf_file)
+);
+CREATE INDEX IF NOT EXISTS invoices_created_at ON invoices (created_at);
+CREATE INDEX IF NOT EXISTS invoices_cost_centre ON invoices (cost_centre, created_at);
+CREATE TABLE IF NOT EXISTS uploads (
+    sha256 TEXT PRIMARY KEY,
+    run_id TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS uploads_run_id ON uploads (run_id);
+"""
+
+invoice_columns = [
+    "run_id", "pdf_file", "cost_centre", "invoice_file", "pdf_path", "subtotal_cents",
+    "gst_cents", "grand_total_cents", "pdf_bytes", "sha256", "created_at",
+]
+
+
+class InvoiceManifest:
+    def __init__(self, db_path="workspaces/manifest.sqlite3"):
+        """
+        SQLite index of the invoices every run produced.
+
+        Each row records a run's invoice PDF with its cost centre, totals in
+        cents, size and SHA-256, so listings and conditional downloads do not
+        have to scan or hash the run folders. The SHA-256 of every uploaded
+        input file is kept with the run that first uploaded it. A connection
+        is opened per call, so the manifest can be shared by threads and
+        worker processes and survives restarts.
+
+        :param db_path: Path of the SQLite database file.
+        """
+        self.db_path = db_path
+        self._ready = False
+
+    def _connect(self):
+        if not self._ready:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.db_path, timeout=30)
+        connection.row_factory = sqlite3.Row
+        if not self._ready:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(schema)
+            self._ready = True
+        return connection
+
+    def record(self, run_id, entries):
+        """
+        Record the invoices of a run, hashing each PDF.
+
+        :param run_id: Identifier of the run.
+        :param entries: Dictionaries with "pdf_file", "cost_centre",
+            "invoice_file", "pdf_path", "subtotal_cents", "gst_cents" and
+            "grand_total_cents", e.g. from InvoiceSummary.manifest_entry.
+        :return: List of the recorded rows as dictionaries.
+        """
+        now = time.time()
+        rows = [
+            {
+                **entry,
+                "run_id": run_id,
+                "pdf_bytes": os.path.getsize(entry["pdf_path"]),
+                "sha256": file_digest(entry["pdf_path"]),
+                "created_at": now,
+            }
+            for entry in entries
+        ]
+        placeholders = ", ".join(f":{column}" for column in invoice_columns)
+        with closing(self._connect()) as connection, connection:
+            connection.executemany(
+                f"INSERT OR REPLACE INTO invoices ({', '.join(invoice_columns)}) VALUES ({placeholders})",
+                rows,
+            )
+        return rows
+
+    def get(self, run_id, pdf_file):
+        """
+        :param run_id: Identifier of the run.
+        :param pdf_file: File name of the PDF.
+        :return: The invoice row as a dictionary, or None if it is not recorded.
+        """
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                "SELECT * FROM invoices WHERE run_id = ? AND pdf_file = ?", (run_id, pdf_file)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def list_invoices(self, run_id=None, cost_centre=None, limit=50, offset=0):
+        """
+        List recorded invoices, newest run first and by PDF name within a run.
+
+        :param run_id: Only list invoices of this run.
+        :param cost_centre: Only list invoices of this cost centre.
+        :param limit: Maximum number of rows returned.
+        :param offset: Number of rows skipped.
+        :return: (total number of matching rows, list of row dictionaries).
+        """
+        conditions, params = [], []
+        if run_id is not None:
+            conditions.append("run_id = ?")
+            params.append(run_id)
+        if cost_centre is not None:
+            conditions.append("cost_centre = ?")
+            params.append(cost_centre)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with closing(self._connect()) as connection:
+            total = connection.execute(f"SELECT COUNT(*) FROM invoices {where}", params).fetchone()[0]
+            rows = connection.execute(
+                f"SELECT * FROM invoices {where} ORDER BY created_at DESC, run_id, pdf_file LIMIT ? OFFSET ?",
+                [*params, limit, offset],
+            ).fetchall()
+        return total, [dict(row) for row in rows]
+
+    def list_runs(self, limit=50, offset=0):
+        """
+        List runs with their invoice count and summed totals, newest first.
+
+        :param limit: Maximum number of runs returned.
+        :param offset: Number of runs skipped.
+        :return: (total number of runs, list of dictionaries with "run_id",
+            "invoices", "subtotal_cents", "gst_cents", "grand_total_cents"
+            and "created_at").
+        """
+        with closing(self._connect()) as connection:
+            total = connection.execute("SELECT COUNT(DISTINCT run_id) FROM invoices").fetchone()[0]
+            rows = connection.execute(
+                """
+                SELECT run_id, COUNT(*) AS invoices, SUM(subtotal_cents) AS subtotal_cents,
+                       SUM(gst_cents) AS gst_cents, SUM(grand_total_cents) AS grand_total_cents,
+                       MIN(created_at) AS created_at
+                FROM invoices GROUP BY run_id ORDER BY created_at DESC, run_id LIMIT ? OFFSET ?
+                """,
+                (limit, offset),
+            ).fetchall()
+        return total, [dict(row) for row in rows]
+
+    def record_upload(self, sha256, run_id):
+        """
+        Record an uploaded file and return the run of an identical earlier upload.
+
+        :param sha256: Digest of the uploaded file.
+        :param run_id: Identifier of the run the upload belongs to.
+        :return: Run that first uploaded a file with the same digest, or None if it is new.
+        """
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                "INSERT OR IGNORE INTO uploads (sha256, run_id, created_at) VALUES (?, ?, ?)",
+                (sha256, run_id, time.time()),
+            )
+            previous = connection.execute(
+                "SELECT run_id FROM uploads WHERE sha256 = ?", (sha256,)
+            ).fetchone()[0]
+        return previous if previous != run_id else None
+
+    def remove_runs(self, run_ids):
+        """
+        Forget the invoices and uploads of runs whose workspace was removed.
+
+        :param run_ids: Iterable of run identifiers.
+        """
+        run_ids = [(run_id,) for run_id in run_ids]
+        if not run_ids:
+            return
+        with closing(self._connect()) as connection, connection:
+            connection.executemany("DELETE FROM invoices WHERE run_id = ?", run_ids)
+            connection.executemany("DELETE FROM uploads WHERE run_id = ?", run_ids)
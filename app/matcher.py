@@ -0,0 +1,107 @@
+import pandas as pd
+
+
+def normalize_name(name):
+    """
+    Normalize a name for matching by removing spaces and lowercasing it.
+
+    :param name: Name to normalize.
+    :return: Normalized name.
+    """
+    return str(name).replace(" ", "").lower()
+
+
+class OrganizationMatchError(LookupError):
+    """
+    Raised when one or more payroll names have no matching organization.
+    """
+
+    def __init__(self, unmatched_names):
+        self.unmatched_names = list(unmatched_names)
+        super().__init__(
+            "No organization in 'Contract Entity' matches payroll name(s): "
+            + ", ".join(repr(name) for name in self.unmatched_names)
+        )
+
+
+class OrganizationMatcher:
+    def __init__(self, organizations_df):
+        """
+        Build a matcher over the organizations table.
+
+        The "Contract Entity" column is normalized once here, so each payroll
+        name only costs a scan of the precomputed entity list the first time
+        it is seen; later lookups are served from the index.
+
+        :param organizations_df: DataFrame containing "Contract Entity" for matching.
+        """
+        self.organizations_df = organizations_df.reset_index(drop=True)
+        self._entities = [
+            normalize_name(entity) for entity in self.organizations_df["Contract Entity"]
+        ]
+        # Exact normalized entity -> first row position, checked before the substring scan
+        self._exact = {}
+        for position, entity in enumerate(self._entities):
+            self._exact.setdefault(entity, position)
+        # Normalized payroll name -> row position (None when unmatched)
+        self._index = {}
+
+    def _resolve(self, payroll_name):
+        """
+        Return the position of the first organization whose normalized
+        "Contract Entity" contains the normalized payroll name.
+
+        :param payroll_name: Payroll name to resolve.
+        :return: Row position in organizations_df, or None if nothing matches.
+        """
+        key = normalize_name(payroll_name)
+        if key in self._index:
+            return self._index[key]
+
+        position = self._exact.get(key)
+        if position is None or any(key in entity for entity in self._entities[:position]):
+            position = next(
+                (i for i, entity in enumerate(self._entities) if key in entity), None
+            )
+        self._index[key] = position
+        return position
+
+    def match(self, payroll_name):
+        """
+        Return the first organization row matching a payroll name.
+
+        :param payroll_name: Payroll name to match.
+        :return: Matching row from organizations_df as a Series.
+        :raises OrganizationMatchError: If no organization matches.
+        """
+        position = self._resolve(payroll_name)
+        if position is None:
+            raise OrganizationMatchError([payroll_name])
+        return self.organizations_df.iloc[position]
+
+    def match_many(self, payroll_names):
+        """
+        Match a column of payroll names, resolving each unique name once.
+
+        :param payroll_names: Iterable (e.g. a Series) of payroll names.
+        :return: DataFrame of matching organization rows, one per input name.
+        :raises OrganizationMatchError: Listing every name that has no match.
+        """
+        names = pd.Series(payroll_names)
+        positions = {name: self._resolve(name) for name in names.unique()}
+        unmatched = [name for name, position in positions.items() if position is None]
+        if unmatched:
+            raise OrganizationMatchError(unmatched)
+        matched = self.organizations_df.iloc[names.map(positions).to_numpy()]
+        return matched.set_index(names.index)
+
+    def first_match(self, payroll_names):
+        """
+        Return the organization matched by the first payroll name, after
+        checking that every name in the column has a match.
+
+        :param payroll_names: Iterable (e.g. a Series) of payroll names.
+        :return: Matching row from organizations_df as a Series.
+        :raises OrganizationMatchError: Listing every name that has no match.
+        """
+        return self.match_many(payroll_names).iloc[0]
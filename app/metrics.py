@@ -0,0 +1,426 @@
+import json
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+
+
+default_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def peak_rss_bytes(children=False):
+    """
+    Peak resident set size of this process, or of its finished child
+    processes (e.g. wkhtmltopdf) when children is set.
+
+    :param children: Report RUSAGE_CHILDREN instead of RUSAGE_SELF.
+    :return: Peak RSS in bytes.
+    """
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss is reported in KiB on Linux
+    return usage.ru_maxrss * 1024
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    pairs = []
+    for name, value in labels:
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, lock):
+        self.name = name
+        self.documentation = documentation
+        self._lock = lock
+        self._values = {}
+
+    def samples(self):
+        """
+        :return: List of (sample name, labels, value) tuples.
+        """
+        with self._lock:
+            return [(self.name, labels, value) for labels, value in sorted(self._values.items())]
+
+    def snapshot(self):
+        """
+        :return: JSON-serialisable dictionary of the metric and its values.
+        """
+        with self._lock:
+            values = [[[list(pair) for pair in labels], self._copy(value)] for labels, value in self._values.items()]
+        return {"kind": self.kind, "documentation": self.documentation, "values": values}
+
+    def merge(self, values, extra_labels=()):
+        """
+        Add the values of a snapshot, e.g. saved by another process.
+
+        :param values: "values" of a snapshot() dictionary.
+        :param extra_labels: (name, value) pairs added to every label set.
+        """
+        with self._lock:
+            for labels, value in values:
+                key = tuple(sorted([tuple(pair) for pair in labels] + list(extra_labels)))
+                current = self._values.get(key)
+                self._values[key] = self._copy(value) if current is None else self._add(current, value)
+
+    @staticmethod
+    def _copy(value):
+        return value
+
+    @staticmethod
+    def _add(current, value):
+        return current + value
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = value
+
+    @staticmethod
+    def _add(current, value):
+        # Values of different processes are told apart by their pid label
+        return value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, lock, buckets=default_buckets):
+        super().__init__(name, documentation, lock)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for position, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry["buckets"][position] += 1
+            entry["sum"] += value
+            entry["count"] += 1
+
+    def snapshot(self):
+        snapshot = super().snapshot()
+        snapshot["buckets"] = list(self.buckets[:-1])
+        return snapshot
+
+    @staticmethod
+    def _copy(value):
+        return {"buckets": list(value["buckets"]), "sum": value["sum"], "count": value["count"]}
+
+    @staticmethod
+    def _add(current, value):
+        current["buckets"] = [a + b for a, b in zip(current["buckets"], value["buckets"])]
+        current["sum"] += value["sum"]
+        current["count"] += value["count"]
+        return current
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for labels, entry in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, entry["buckets"]):
+                    samples.append((f"{self.name}_bucket", labels + (("le", format_value(bound)),), count))
+                samples.append((f"{self.name}_sum", labels, entry["sum"]))
+                samples.append((f"{self.name}_count", labels, entry["count"]))
+        return samples
+
+
+class MetricsRegistry:
+    def __init__(self, directory=None):
+        """
+        Process-wide collection of counters, gauges and histograms, rendered
+        in the Prometheus text exposition format.
+
+        Each worker process keeps its own registry. When directory is set,
+        which the worker processes share, every process saves its values
+        there on flush() and render() reports counters and histograms summed
+        over all processes, including exited ones (see mark_process_dead),
+        and gauges per process with a "pid" label.
+
+        :param directory: Optional folder shared by the worker processes.
+        """
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._metrics = {}
+        self._collectors = []
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation):
+        return self._register(Counter(name, documentation, threading.Lock()))
+
+    def gauge(self, name, documentation):
+        return self._register(Gauge(name, documentation, threading.Lock()))
+
+    def histogram(self, name, documentation, buckets=default_buckets):
+        return self._register(Histogram(name, documentation, threading.Lock(), buckets))
+
+    def add_collector(self, collector):
+        """
+        Register a callable run before every render, e.g. to refresh gauges.
+
+        :param collector: Callable taking no arguments.
+        """
+        self._collectors.append(collector)
+
+    def snapshot(self):
+        """
+        :return: JSON-serialisable dictionary of every metric, by name.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+    def merge_snapshot(self, snapshot, pid=None):
+        """
+        Add the values of a snapshot to this registry.
+
+        :param snapshot: Dictionary returned by snapshot().
+        :param pid: Process the snapshot belongs to, added as "pid" label to
+            gauges; gauges are skipped when it is None.
+        """
+        for name, entry in snapshot.items():
+            extra_labels = ()
+            if entry["kind"] == "gauge":
+                if pid is None:
+                    continue
+                extra_labels = (("pid", str(pid)),)
+            if entry["kind"] == "histogram":
+                metric = self.histogram(name, entry["documentation"], entry["buckets"])
+            else:
+                metric = getattr(self, entry["kind"])(name, entry["documentation"])
+            metric.merge(entry["values"], extra_labels)
+
+    def _write(self, path, snapshot):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, path)
+
+    def _read(self, path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def flush(self):
+        """
+        Save the values of this process to the shared directory, if one is set.
+        """
+        if not self.directory:
+            return
+        with self._flush_lock:
+            self._write(os.path.join(self.directory, f"metrics_{os.getpid()}.json"), self.snapshot())
+
+    def mark_process_dead(self, pid):
+        """
+        Fold the counters and histograms of an exited process into the
+        totals of exited processes and drop its gauges.
+
+        Called by the process supervising the workers; does nothing without a directory.
+
+        :param pid: Process id of the exited worker.
+        """
+        if not self.directory:
+            return
+        path = os.path.join(self.directory, f"metrics_{pid}.json")
+        dead_path = os.path.join(self.directory, "metrics_dead.json")
+        totals = MetricsRegistry()
+        totals.merge_snapshot(self._read(dead_path))
+        totals.merge_snapshot(self._read(path))
+        with self._flush_lock:
+            self._write(dead_path, totals.snapshot())
+        if os.path.exists(path):
+            os.remove(path)
+
+    def clear_directory(self):
+        """
+        Remove the values saved by earlier processes, e.g. when the server starts.
+        """
+        if not self.directory or not os.path.isdir(self.directory):
+            return
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith("metrics_") and entry.name.endswith((".json", ".tmp")):
+                os.remove(entry.path)
+
+    def render(self):
+        """
+        :return: All metrics in the Prometheus text exposition format, summed
+            over all processes sharing the directory if one is set.
+        """
+        for collector in self._collectors:
+            collector()
+        if self.directory:
+            self.flush()
+            merged = MetricsRegistry()
+            for entry in sorted(os.scandir(self.directory), key=lambda entry: entry.name):
+                if not (entry.name.startswith("metrics_") and entry.name.endswith(".json")):
+                    continue
+                pid = entry.name[len("metrics_"):-len(".json")]
+                merged.merge_snapshot(self._read(entry.path), None if pid == "dead" else pid)
+            source = merged
+        else:
+            source = self
+        with source._lock:
+            metrics = list(source._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for sample_name, labels, value in metric.samples():
+                lines.append(f"{sample_name}{format_labels(labels)} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+runs_total = registry.counter("payrun_runs_total", "Pay runs finished, by outcome.")
+stage_seconds = registry.histogram("payrun_stage_duration_seconds", "Duration of pay-run stages.")
+rows_total = registry.counter("payrun_rows_processed_total", "Rows processed, by stage and kind.")
+render_seconds = registry.histogram("payrun_pdf_render_duration_seconds", "Render time of a single invoice PDF.")
+pdf_bytes = registry.histogram(
+    "payrun_pdf_size_bytes", "Size of rendered invoice PDFs.",
+    buckets=(10e3, 50e3, 100e3, 250e3, 500e3, 1e6, 5e6, 20e6),
+)
+pdf_cache_total = registry.counter("payrun_pdf_cache_requests_total", "PDF cache lookups, by result.")
+webhook_seconds = registry.histogram("payrun_webhook_request_duration_seconds", "Latency of webhook batch deliveries.")
+webhook_batches_total = registry.counter("payrun_webhook_batches_total", "Webhook batches, by outcome.")
+peak_rss = registry.gauge("process_peak_rss_bytes", "Peak resident set size, for this process or its children.")
+registry.add_collector(lambda: (peak_rss.set(peak_rss_bytes(), process="self"),
+                                peak_rss.set(peak_rss_bytes(children=True), process="children")))
+
+
+class RunMetrics:
+    def __init__(self):
+        """
+        Measurements of a single pay run, also fed into the process-wide
+        registry, which is flushed after every update.
+        """
+        self.stages = {}
+        self.rows = {}
+        self.invoices = []
+        self.webhook_batches = []
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Time a stage of the run.
+
+        :param name: Stage name.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            self.stages[name] = round(duration, 3)
+            stage_seconds.observe(duration, stage=name)
+            registry.flush()
+
+    def add_rows(self, stage, **counts):
+        """
+        Record numbers of rows processed by a stage.
+
+        :param stage: Stage name.
+        :param counts: Row counts by kind, e.g. pay_journal=1200.
+        """
+        for kind, count in counts.items():
+            self.rows[f"{stage}.{kind}"] = count
+            rows_total.inc(count, stage=stage, kind=kind)
+        registry.flush()
+
+    def add_render_results(self, results):
+        """
+        Record per-invoice render times, PDF sizes and cache use.
+
+        :param results: List of RenderResult objects.
+        """
+        for result in results:
+            self.invoices.append({
+                "invoice_file": result.invoice_file,
+                "render_seconds": round(result.duration, 3),
+                "pdf_bytes": result.pdf_bytes,
+                "cached": result.cached,
+            })
+            if not result.success:
+                continue
+            pdf_cache_total.inc(result="hit" if result.cached else "miss")
+            if not result.cached:
+                render_seconds.observe(result.duration)
+            if result.pdf_bytes is not None:
+                pdf_bytes.observe(result.pdf_bytes)
+        registry.flush()
+
+    def add_webhook_batches(self, batches):
+        """
+        Record webhook latency and outcome per batch.
+
+        :param batches: Batch status dictionaries returned by WebhookSender.
+        """
+        for batch in batches:
+            self.webhook_batches.append({
+                "batch": batch["batch"],
+                "seconds": batch["seconds"],
+                "attempts": batch["attempts"],
+                "status_code": batch["status_code"],
+                "success": batch["success"],
+            })
+            webhook_seconds.observe(batch["seconds"])
+            webhook_batches_total.inc(outcome="success" if batch["success"] else "failure")
+        registry.flush()
+
+    def finish(self, outcome):
+        """
+        Count the finished run.
+
+        :param outcome: "succeeded" or "failed".
+        """
+        runs_total.inc(outcome=outcome)
+        registry.flush()
+
+    def to_dict(self):
+        return {
+            "stages": self.stages,
+            "rows": self.rows,
+            "invoices": self.invoices,
+            "webhook_batches": self.webhook_batches,
+            "peak_rss_bytes": peak_rss_bytes(),
+            "peak_child_rss_bytes": peak_rss_bytes(children=True),
+        }
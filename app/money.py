@@ -0,0 +1,68 @@
+import numpy as np
+
+
+# Units and rates are scaled to this many parts per whole before they are multiplied
+quantity_scale = 10000
+gst_rate_percent = 10
+
+
+def round_half_up_div(numerator, denominator):
+    """
+    Divide integers, rounding halves away from zero.
+
+    :param numerator: int64 array (or int) to divide.
+    :param denominator: Positive integer divisor.
+    :return: Rounded quotient with the same shape as numerator.
+    """
+    sign = np.sign(numerator)
+    return sign * ((np.abs(numerator) + denominator // 2) // denominator)
+
+
+def line_amount_cents(units, rates):
+    """
+    Multiply units by rates and round the product to whole cents.
+
+    Both inputs are scaled to 1/10000 and multiplied as int64, so the product
+    is exact and only rounded once (half up), not carried as a binary float.
+
+    :param units: Float array of quantities.
+    :param rates: Float array of rates in dollars, same shape as units.
+    :return: int64 array of amounts in cents.
+    :raises ValueError: If a unit or rate is NaN or infinite; casting those
+        to int64 would silently turn the amount into garbage or zero.
+    """
+    units = np.asarray(units, dtype=float)
+    rates = np.asarray(rates, dtype=float)
+    if not (np.isfinite(units).all() and np.isfinite(rates).all()):
+        raise ValueError("Units and rates must be finite numbers")
+    scaled_units = np.rint(units * quantity_scale).astype(np.int64)
+    scaled_rates = np.rint(rates * quantity_scale).astype(np.int64)
+    return round_half_up_div(scaled_units * scaled_rates, quantity_scale * quantity_scale // 100)
+
+
+def gst_cents(subtotal_cents, rate_percent=gst_rate_percent):
+    """
+    :param subtotal_cents: Subtotal in cents.
+    :param rate_percent: GST rate in percent.
+    :return: GST in cents, rounded half up.
+    """
+    return int(round_half_up_div(int(subtotal_cents) * rate_percent, 100))
+
+
+def cents_to_dollars(cents):
+    """
+    :param cents: Amount(s) in cents.
+    :return: Amount(s) in dollars as float.
+    """
+    return cents / 100
+
+
+def format_cents(cents):
+    """
+    :param cents: Amount in cents.
+    :return: Amount in dollars with two decimals, e.g. "1234.50".
+    """
+    cents = int(cents)
+    sign = "-" if cents < 0 else ""
+    whole, fraction = divmod(abs(cents), 100)
+    return f"{sign}{whole}.{fraction:02d}"
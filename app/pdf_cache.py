@@ -0,0 +1,106 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+
+
+class PdfCache:
+    def __init__(self, directory="pdf_cache", max_bytes=1024 ** 3, max_age=30 * 24 * 3600):
+        """
+        Content-addressed store of rendered invoice PDFs.
+
+        Entries are keyed by a fingerprint of everything that goes into a
+        PDF, so an unchanged invoice can be copied from the cache instead of
+        being rendered by wkhtmltopdf again. Hits and misses are counted per
+        render in app.metrics (payrun_pdf_cache_requests_total).
+
+        :param directory: Folder holding the cached PDFs.
+        :param max_bytes: Total cache size above which the least recently used entries are evicted.
+        :param max_age: Seconds after which an unused entry is evicted.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def fingerprint(*parts):
+        """
+        Compute the cache key for a set of inputs.
+
+        :param parts: Strings or bytes that determine the PDF contents.
+        :return: Hex SHA-256 digest.
+        """
+        digest = hashlib.sha256()
+        for part in parts:
+            if isinstance(part, str):
+                part = part.encode("utf-8")
+            digest.update(len(part).to_bytes(8, "big"))
+            digest.update(part)
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.pdf")
+
+    def fetch(self, key, destination):
+        """
+        Copy a cached PDF to destination if one exists for key.
+
+        :param key: Fingerprint returned by fingerprint().
+        :param destination: Path to copy the PDF to.
+        :return: True on a cache hit, False on a miss.
+        """
+        path = self._path(key)
+        try:
+            shutil.copyfile(path, destination)
+            # Refresh the entry so eviction treats it as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def store(self, key, source):
+        """
+        Add a rendered PDF to the cache.
+
+        :param key: Fingerprint returned by fingerprint().
+        :param source: Path of the rendered PDF.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        os.close(fd)
+        try:
+            shutil.copyfile(source, tmp_path)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def evict(self):
+        """
+        Remove entries older than max_age, then the least recently used
+        entries until the cache is no larger than max_bytes.
+
+        :return: Number of entries removed.
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(".pdf"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+
+        removed = 0
+        cutoff = time.time() - self.max_age
+        total_bytes = sum(size for _, size, _ in entries)
+        for mtime, size, path in entries:
+            if mtime >= cutoff and total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+            removed += 1
+        return removed
@@ -1,20 +1,140 @@
 import os
+import pickle
+import shutil
+import tempfile
+import numpy as np
 import pandas as pd
 import openpyxl as px
 from datetime import datetime
 from app.csv_reader import DataReader
+from app.fingerprints import frame_fingerprint
+from app.line_store import invoice_suffix, save_invoice_lines
+from app.money import cents_to_dollars, line_amount_cents
 
 
 class DataProcessor:
-    def __init__(self, file_paths):
+    # Pay Journal item column -> Charge Sheet rate column
+    pay_item_mapping = {
+        "Normal Hourly (Qty)": "NT",
+        "Overtime 2.0 (Qty)": "OT",
+        "AMWU - Meal Allowance (Meal)": "Overtime Meal Allowance",
+        "Site Allowance - VIC (Qty)": "Site Allowance",
+        "AMWU - Travel & Fares (Travel)": "Travel & Fares Allowance",
+        "Overtime Productivity Allowance-VIC (Qty)": "Overtime Productivity Allowance",
+        "Overtime 1.8 (Qty)": "OT",
+        "Nightshift 1.8 (Qty)": "NT Shift",
+        "Night Shift 200% (Qty)": "NT Shift",
+        "AWU - Travel Allowance (Travel)": "Travel & Fares Allowance",
+        "AWU - Overtime Meal Allowance (Meal)": "Overtime Meal Allowance",
+        "Rain Work 1.0 (Qty)": "NT",
+    }
+
+    # Columns of each input table the pipeline uses; other columns are not loaded
+    pay_journal_columns = [
+        "Employee No.",
+        "Last Name",
+        "Given Names",
+        "Cost Centre",
+        "Payroll Name Selection",
+        "Period End Date",
+        *pay_item_mapping,
+    ]
+    # Pay items are always read as float, so a chunk or cost centre holding only
+    # whole hours is not inferred as int64 and fingerprinted differently
+    pay_journal_dtypes = dict.fromkeys(pay_item_mapping, "float64")
+    job_classification_columns = ["Employee Number", "Last Name", "First Name", "Job Classification"]
+    charge_sheet_columns = ["Job Classification", *dict.fromkeys(pay_item_mapping.values())]
+
+    def __init__(self, file_paths=None, frames=None, debug_output=False,
+                 output_folder="output_folder", invoice_folder="invoice_folder",
+                 previous_fingerprints=None, fingerprint_salt=(), export_csv=False,
+                 pay_journal_chunks=None, spill_folder=None):
         """
-        Initialize DataProcessor with a list of file paths.
+        Initialize DataProcessor with a list of file paths or in-memory tables.
 
         :param file_paths: List of file paths to be processed.
+        :param frames: Optional tuple of (pay journal, job classifications,
+            charge sheet) DataFrames. When given, file_paths is not read.
+        :param debug_output: Write each cost centre's merged data to the output folder.
+        :param output_folder: Folder for the per-cost-centre debug output.
+        :param invoice_folder: Folder to write the invoice line files to.
+        :param previous_fingerprints: Optional dictionary mapping cost centres to
+            the fingerprint of their last delivered inputs. Cost centres whose
+            fingerprint is unchanged are skipped by process_data.
+        :param fingerprint_salt: Extra values mixed into every fingerprint, e.g.
+            digests of the reference data the invoices are rendered with.
+        :param export_csv: Also write every invoice as a CSV file next to its .npy file.
+        :param pay_journal_chunks: Optional iterable of Pay Journal DataFrame chunks.
+            When given, process_data runs in streaming mode (see process_data_chunked).
+        :param spill_folder: Folder for the per-cost-centre spill files of the
+            streaming mode; a temporary folder is used by default.
+        """
+        self.file_paths = file_paths or []
+        self.frames = frames
+        self.debug_output = debug_output
+        self.output_folder = output_folder
+        self.invoice_folder = invoice_folder
+        self.previous_fingerprints = previous_fingerprints
+        self.fingerprint_salt = tuple(fingerprint_salt)
+        self.export_csv = export_csv
+        self.pay_journal_chunks = pay_journal_chunks
+        self.spill_folder = spill_folder
+        self.fingerprints = {}
+        self.invoice_files = {}
+        self.row_counts = {}
+        self.rebuilt = []
+        self.skipped = []
+
+    @classmethod
+    def from_frames(cls, pay_journal_df, job_classifications_df, charge_sheet_df, **kwargs):
+        """
+        Create a DataProcessor that works directly on uploaded tables.
+
+        :param pay_journal_df: Pay Journal DataFrame (header row already skipped).
+        :param job_classifications_df: Job_Classifications DataFrame.
+        :param charge_sheet_df: Charge Sheet DataFrame.
+        :param kwargs: Extra keyword arguments passed to the constructor.
+        :return: DataProcessor instance.
+        """
+        return cls(frames=(pay_journal_df, job_classifications_df, charge_sheet_df), **kwargs)
+
+    @classmethod
+    def from_chunks(cls, pay_journal_chunks, job_classifications_df, charge_sheet_df, **kwargs):
+        """
+        Create a DataProcessor that streams the Pay Journal in chunks.
+
+        :param pay_journal_chunks: Iterable of Pay Journal DataFrames, e.g. from DataReader.iter_chunks.
+        :param job_classifications_df: Job_Classifications DataFrame.
+        :param charge_sheet_df: Charge Sheet DataFrame.
+        :param kwargs: Extra keyword arguments passed to the constructor.
+        :return: DataProcessor instance.
+        """
+        return cls(
+            frames=(None, job_classifications_df, charge_sheet_df),
+            pay_journal_chunks=pay_journal_chunks,
+            **kwargs,
+        )
+
+    @staticmethod
+    def group_journal(journal_df):
+        """
+        Fill missing values in the Pay Journal and group it by 'Cost Centre'.
+
+        :param journal_df: Pay Journal DataFrame.
+        :return: Grouped DataFrame.
+        """
+        journal_df = journal_df.fillna(0)
+        return journal_df.groupby("Cost Centre")
+
+    @staticmethod
+    def group_classifications(sheet_df):
         """
-        self.file_paths = file_paths
-        self.output_folder = "output_folder"
-        self.invoice_folder = "invoice_folder"
+        Group a Job_Classifications or Charge Sheet table by 'Job Classification'.
+
+        :param sheet_df: Sheet DataFrame.
+        :return: Grouped DataFrame.
+        """
+        return sheet_df.groupby("Job Classification")
 
     def process_csv(self, file_path):
         """
@@ -24,10 +144,10 @@ class DataProcessor:
         :return: Grouped DataFrame.
         """
         journal_data = DataReader(file_path)
-        journal_df = journal_data.read_csv(skip_rows=1)
-        journal_df.fillna(0, inplace=True)
-        grouped_journal_df = journal_df.groupby("Cost Centre")
-        return grouped_journal_df
+        journal_df = journal_data.read_csv(
+            skip_rows=1, columns=self.pay_journal_columns, dtypes=self.pay_journal_dtypes
+        )
+        return self.group_journal(journal_df)
 
     def process_xlsx(self, file_path):
         """
@@ -36,12 +156,16 @@ class DataProcessor:
         :param file_path: Path of the XLSX file to be processed.
         :return: Grouped DataFrames for 'Job_Classifications' and 'Charge Sheet'.
         """
-        workbook = px.load_workbook(file_path, data_only=True)
+        reader = DataReader(file_path)
+        sheet_names = reader.sheet_names()
         grouped_data = {}
-        for sheet_name in ["Job_Classifications", "Charge Sheet"]:
-            if sheet_name in workbook.sheetnames:
-                journal_df = pd.read_excel(file_path, sheet_name=sheet_name)
-                grouped_data[sheet_name] = journal_df.groupby("Job Classification")
+        for sheet_name, columns in [
+            ("Job_Classifications", self.job_classification_columns),
+            ("Charge Sheet", self.charge_sheet_columns),
+        ]:
+            if sheet_name in sheet_names:
+                journal_df = reader.read_excel(sheet_name=sheet_name, skip_rows=0, columns=columns)
+                grouped_data[sheet_name] = self.group_classifications(journal_df)
         return grouped_data["Job_Classifications"], grouped_data["Charge Sheet"]
 
     def process_and_return_data(self):
@@ -60,135 +184,346 @@ class DataProcessor:
                 print(f"Unsupported file format for {file_path}. Skipping...")
         return grouped_data
 
+    def load_tables(self):
+        """
+        Load the Pay Journal, Job_Classifications and Charge Sheet tables.
+
+        Uses the in-memory frames when available, otherwise reads file_paths.
+
+        :return: Tuple of (pay journal, job classifications, charge sheet) DataFrames.
+        """
+        if self.frames is not None:
+            pay_journal_df, job_classifications_df, charge_sheet_df = self.frames
+            grouped_tables = [
+                self.group_journal(pay_journal_df),
+                self.group_classifications(job_classifications_df),
+                self.group_classifications(charge_sheet_df),
+            ]
+        else:
+            grouped_tables = []
+            for grouped_df in self.process_and_return_data().values():
+                if isinstance(grouped_df, pd.core.groupby.generic.DataFrameGroupBy):
+                    grouped_tables.append(grouped_df)
+                else:
+                    grouped_tables.extend(grouped_df)
+
+        return tuple(pd.concat([group for name, group in grouped_df]) for grouped_df in grouped_tables)
+
+    @staticmethod
+    def export_workbook(tables, file_path):
+        """
+        Write the Job_Classifications and Charge Sheet tables to a reconciliation workbook.
+
+        :param tables: Dictionary mapping sheet names to DataFrames.
+        :param file_path: Path of the workbook to write.
+        """
+        workbook = px.Workbook(write_only=True)
+        for sheet_name, df in tables.items():
+            ws = workbook.create_sheet(title=sheet_name)
+            ws.append(list(df.columns))
+            for row in df.itertuples(index=False, name=None):
+                ws.append(list(row))
+        workbook.save(file_path)
+        workbook.close()
+
     def create_output_folders(self):
         """
         Create output and invoice folders if they don't exist.
         """
-        os.makedirs(self.output_folder, exist_ok=True)
+        if self.debug_output:
+            os.makedirs(self.output_folder, exist_ok=True)
         os.makedirs(self.invoice_folder, exist_ok=True)
 
+    def merge_tables(self, tables):
+        """
+        Merge the Pay Journal with the job classifications once.
+
+        :param tables: Tuple of (pay journal, job classifications, charge sheet) DataFrames.
+        :return: Merged DataFrame with one row per Pay Journal entry.
+        """
+        data1, data2, data3 = tables
+        column_mapping = {"Employee Number": "Employee No.", "First Name": "Given Names"}
+        data2 = data2.rename(columns=column_mapping)
+        merged_data = data2.merge(data1, on=["Employee No.", "Last Name"], how="inner")
+        merged_data = merged_data.drop(columns="Given Names_y")
+        merged_data = merged_data.rename(columns={"Given Names_x": "Given Names"})
+        return merged_data
+
+    def split_cost_centres(self, merged_data, charge_sheet_df):
+        """
+        Split the merged data by 'Cost Centre' and attach the charge sheet rates.
+
+        :param merged_data: DataFrame returned by merge_tables.
+        :param charge_sheet_df: Charge Sheet DataFrame.
+        :return: Generator of (cost centre, DataFrame) pairs.
+        """
+        for cost_centre, group in merged_data.groupby("Cost Centre"):
+            filtered_data = group.merge(charge_sheet_df, on=["Job Classification"], how="inner")
+            yield str(cost_centre), filtered_data
+
+    invoice_columns = [
+        "Serviced",
+        "Description",
+        "Unit",
+        "Rate",
+        "Amount Cents",
+        "Given Names",
+        "Last Name",
+        "Cost Centre",
+        "Payroll Name",
+    ]
+
+    def build_invoice_lines(self, data, file_stem):
+        """
+        Build invoice lines for a single cost centre.
+
+        All mapped pay items are processed together: units and rates are
+        gathered into (rows x items) matrices, multiplied at once and stacked
+        item by item, which yields the lines in the same order as looping
+        over the mapping row by row.
+
+        :param data: Cost centre DataFrame returned by split_cost_centres.
+        :param file_stem: File name stem of the cost centre, used as description prefix.
+        :return: DataFrame of invoice lines sorted by employee, with float
+            Unit and Rate columns and an int64 "Amount Cents" column (see
+            app.money.line_amount_cents).
+        :raises ValueError: If an employee has units of a pay item whose rate
+            is blank or not a number, or units that are not a number.
+        """
+        data = data.reset_index(drop=True)
+        prefix = file_stem.split("-")[0]
+        pairs = [
+            (src_col, target_col)
+            for src_col, target_col in self.pay_item_mapping.items()
+            if src_col in data.columns and target_col in data.columns
+        ]
+        units = data[[src_col for src_col, _ in pairs]].to_numpy(dtype=float)
+        rates = data[[target_col for _, target_col in pairs]].to_numpy(dtype=float)
+
+        # Skip pay items where every unit or every rate is zero
+        active = (units != 0).any(axis=0) & (rates != 0).any(axis=0)
+        units, rates = units[:, active], rates[:, active]
+        sources = [src_col for (src_col, _), keep in zip(pairs, active) if keep]
+        targets = [target_col for (_, target_col), keep in zip(pairs, active) if keep]
+        row_count, item_count = units.shape
+
+        unbillable = ~np.isfinite(units) | (~np.isfinite(rates) & (units != 0))
+        if unbillable.any():
+            positions = np.argwhere(unbillable)
+            row, item = positions[0]
+            employee = data.iloc[row]
+            others = len(positions) - 1
+            others = f" (and {others} more line{'s' if others > 1 else ''})" if others else ""
+            raise ValueError(
+                f"Cost centre {employee['Cost Centre']}: employee {employee['Employee No.']} "
+                f"({employee['Given Names']} {employee['Last Name']}) has {units[row, item]:g} units of "
+                f"'{sources[item]}' at a rate of {rates[row, item]:g} for '{targets[item]}' "
+                f"({employee['Job Classification']}), which cannot be billed{others}"
+            )
+        # A blank rate only bills nothing when the employee has no units of the item
+        billed_rates = np.where(units == 0, 0.0, rates)
+
+        if not row_count or not item_count:
+            return pd.DataFrame(columns=self.invoice_columns).astype(
+                {"Unit": float, "Rate": float, "Amount Cents": np.int64}
+            )
+
+        period_end_date = data["Period End Date"].iloc[0]
+        if isinstance(period_end_date, str):
+            period_end_date = datetime.strptime(period_end_date, "%d/%m/%Y")
+        else:
+            # Workbook uploads carry real date cells
+            period_end_date = pd.Timestamp(period_end_date).to_pydatetime()
+        serviced_start_date = period_end_date - pd.DateOffset(days=6)
+        serviced_period = f"{serviced_start_date.strftime('%d/%m/%Y')} - {period_end_date.strftime('%d/%m/%Y')}"
+
+        head = (data["Job Classification"] + "-" + prefix + "-").to_numpy()
+        tail = ("-" + data["Given Names"] + "-" + data["Last Name"]).to_numpy()
+        description = (
+            pd.Series(np.tile(head, item_count))
+            + pd.Series(np.repeat(targets, row_count))
+            + pd.Series(np.tile(tail, item_count))
+        )
+        payroll_names = data["Payroll Name Selection"].str.split("-", n=1).str[0].to_numpy()
+
+        # Column-major ravel keeps all rows of one pay item together, in mapping order
+        result_df = pd.DataFrame(
+            {
+                "Serviced": serviced_period,
+                "Description": description.to_numpy(),
+                "Unit": units.ravel(order="F"),
+                "Rate": rates.ravel(order="F"),
+                "Amount Cents": line_amount_cents(units, billed_rates).ravel(order="F"),
+                "Given Names": np.tile(data["Given Names"].to_numpy(), item_count),
+                "Last Name": np.tile(data["Last Name"].to_numpy(), item_count),
+                "Cost Centre": np.tile(data["Cost Centre"].to_numpy(), item_count),
+                "Payroll Name": np.tile(payroll_names, item_count),
+            }
+        )
+        return result_df.sort_values(by=["Given Names", "Last Name"])
+
+    def cost_centre_fingerprint(self, data):
+        """
+        Fingerprint the inputs of one cost centre's invoice.
+
+        The merged data holds the cost centre's Pay Journal rows joined with
+        their job classifications and charge sheet rates, so a change to any
+        of the three tables changes the fingerprint.
+
+        :param data: Cost centre DataFrame returned by split_cost_centres.
+        :return: Hex digest.
+        """
+        return frame_fingerprint(data, repr(self.pay_item_mapping), *self.fingerprint_salt)
+
+    def process_cost_centre(self, cost_centre, filtered_data):
+        """
+        Fingerprint one cost centre and, unless it is unchanged, write its invoice.
+
+        :param cost_centre: Cost Centre name.
+        :param filtered_data: Cost centre DataFrame returned by split_cost_centres.
+        :return: (invoice file name, invoice line DataFrame), or None if it was skipped.
+        """
+        fingerprint = self.cost_centre_fingerprint(filtered_data)
+        self.fingerprints[cost_centre] = fingerprint
+        if self.previous_fingerprints and self.previous_fingerprints.get(cost_centre) == fingerprint:
+            self.skipped.append(cost_centre)
+            return None
+        self.rebuilt.append(cost_centre)
+
+        file_stem = cost_centre.replace(" ", "_")
+        if self.debug_output:
+            filtered_data.set_index("Employee No.").to_csv(
+                os.path.join(self.output_folder, f"{file_stem}.csv")
+            )
+
+        result_df = self.build_invoice_lines(filtered_data, file_stem)
+
+        # Save the invoice for the current cost centre
+        invoice_filename = f"{file_stem}{invoice_suffix}"
+        save_invoice_lines(result_df, os.path.join(self.invoice_folder, invoice_filename))
+        if self.export_csv:
+            export_df = result_df.rename(columns={"Amount Cents": "Amount"})
+            export_df["Amount"] = cents_to_dollars(export_df["Amount"])
+            export_df.to_csv(
+                os.path.join(self.invoice_folder, f"{file_stem}_invoice.csv"),
+                header=True, index=False, float_format="%.2f",
+            )
+        self.invoice_files[cost_centre] = invoice_filename
+        self.row_counts["invoice_lines"] += len(result_df)
+        return invoice_filename, result_df
+
     def process_data(self):
         """
-        Process data, generate invoices, and save them in the output folder.
+        Process data, generate invoices, and save them in the invoice folder.
+
+        Invoice lines are saved as typed .npy records (see app.line_store)
+        for the render and summary stages; CSV copies are only written when
+        export_csv is set.
+
+        The tables are merged and split by 'Cost Centre' once; each cost centre
+        goes straight to invoice-line generation. The per-cost-centre merged
+        data is only written to the output folder when debug_output is set.
+
+        Every cost centre's fingerprint is kept in self.fingerprints. When
+        previous_fingerprints is set, cost centres whose fingerprint matches are
+        listed in self.skipped and get no invoice file; the others are listed
+        in self.rebuilt. self.invoice_files maps rebuilt cost centres to their
+        invoice file name, and self.row_counts holds the number of Pay Journal,
+        merged and invoice line rows processed.
+
+        :return: Dictionary mapping invoice file names to invoice line DataFrames.
         """
         self.create_output_folders()
-        
-        grouped_data = self.process_and_return_data()
-        file_data = {}
-
-        for file_path, grouped_df in grouped_data.items():
-            if isinstance(grouped_df, pd.core.groupby.generic.DataFrameGroupBy):
-                grouped_journal_df = pd.concat([group for name, group in grouped_df])
-                file_data[file_path] = grouped_journal_df
-            else:
-                for sheet_name, sheet_data in enumerate(grouped_df):
-                    grouped_journal_df = pd.concat([group for name, group in sheet_data])
-                    file_data[f"{file_path}_{sheet_name}"] = grouped_journal_df
-
-        for file_path in file_data:
-            # Process and merge data
-            data1 = file_data["./uploads/Pay Journal (CSV).csv"]
-            data2 = file_data["./uploads/CYP invoice query FY 24 Auto Reconciliation.xlsm_0"]
-            data3 = file_data["./uploads/CYP invoice query FY 24 Auto Reconciliation.xlsm_1"]
-
-            column_mapping = {"Employee Number": "Employee No.", "First Name": "Given Names"}
-            data2 = data2.rename(columns=column_mapping)
-            merged_data = data2.merge(data1, on=["Employee No.", "Last Name"], how="inner")
-            merged_data = merged_data.drop(columns="Given Names_y")
-            merged_data = merged_data.rename(columns={"Given Names_x": "Given Names"})
-            unique_cost_centre = merged_data["Cost Centre"].unique()
-
-            # Create separate CSV files for each unique Cost Centre
-            for cost_centre in unique_cost_centre:
-                filtered_data = merged_data[merged_data["Cost Centre"] == cost_centre].copy()
-                filtered_data = filtered_data.merge(data3, on=["Job Classification"], how="inner")
-                filtered_data.set_index("Employee No.", inplace=True)
-                filename = f"{cost_centre.replace(' ', '_')}.csv"
-                file_path = os.path.join(self.output_folder, filename)
-                filtered_data.to_csv(file_path)
-
-            # Define your mapping
-            mapping = {
-                "Normal Hourly (Qty)": "NT",
-                "Overtime 2.0 (Qty)": "OT",
-                "AMWU - Meal Allowance (Meal)": "Overtime Meal Allowance",
-                "Site Allowance - VIC (Qty)": "Site Allowance",
-                "AMWU - Travel & Fares (Travel)": "Travel & Fares Allowance",
-                "Overtime Productivity Allowance-VIC (Qty)": "Overtime Productivity Allowance",
-                "Overtime 1.8 (Qty)": "OT",
-                "Nightshift 1.8 (Qty)": "NT Shift",
-                "Night Shift 200% (Qty)": "NT Shift",
-                "AWU - Travel Allowance (Travel)": "Travel & Fares Allowance",
-                "AWU - Overtime Meal Allowance (Meal)": "Overtime Meal Allowance",
-                "Rain Work 1.0 (Qty)": "NT",
-            }
+        if self.pay_journal_chunks is not None:
+            return self.process_data_chunked()
+
+        tables = self.load_tables()
+        merged_data = self.merge_tables(tables)
+        invoices = {}
+        self.row_counts = {"pay_journal": len(tables[0]), "merged": len(merged_data), "invoice_lines": 0}
+
+        for cost_centre, filtered_data in self.split_cost_centres(merged_data, tables[2]):
+            invoice = self.process_cost_centre(cost_centre, filtered_data)
+            if invoice is not None:
+                invoices[invoice[0]] = invoice[1]
+
+        return invoices
+
+    @staticmethod
+    def append_partition(file_path, df):
+        with open(file_path, "ab") as f:
+            pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def read_partition(file_path):
+        pieces = []
+        with open(file_path, "rb") as f:
+            while True:
+                try:
+                    pieces.append(pickle.load(f))
+                except EOFError:
+                    break
+        return pd.concat(pieces)
+
+    def partition_pay_journal(self, spill_folder):
+        """
+        Spill the Pay Journal chunks into one file per 'Cost Centre'.
+
+        Each chunk gets the same fillna(0) as group_journal and its rows are
+        appended to their cost centre's spill file, so a partition holds the
+        rows of one cost centre in file order.
+
+        :param spill_folder: Folder to write the spill files to.
+        :return: Dictionary mapping cost centres to spill file paths.
+        """
+        partitions = {}
+        for chunk in self.pay_journal_chunks:
+            self.row_counts["pay_journal"] += len(chunk)
+            for cost_centre, group in chunk.fillna(0).groupby("Cost Centre"):
+                file_path = partitions.get(cost_centre)
+                if file_path is None:
+                    file_path = partitions[cost_centre] = os.path.join(
+                        spill_folder, f"partition_{len(partitions):05d}.pkl"
+                    )
+                self.append_partition(file_path, group)
+        return partitions
+
+    def process_data_chunked(self):
+        """
+        Streaming variant of process_data for Pay Journals too large to hold in memory.
+
+        The Pay Journal chunks are partitioned by 'Cost Centre' into spill
+        files, then each partition is merged with the (small) job
+        classifications and charge sheet tables on its own, in cost centre
+        order. Peak memory follows the largest cost centre instead of the
+        whole journal. The output matches process_data; the invoice line
+        DataFrames are not kept, so the returned values are None.
+
+        :return: Dictionary mapping invoice file names to None.
+        """
+        _, job_classifications_df, charge_sheet_df = self.frames
+        job_classifications_df = pd.concat(
+            [group for name, group in self.group_classifications(job_classifications_df)]
+        )
+        charge_sheet_df = pd.concat([group for name, group in self.group_classifications(charge_sheet_df)])
+        self.row_counts = {"pay_journal": 0, "merged": 0, "invoice_lines": 0}
+        invoices = {}
+
+        if self.spill_folder:
+            os.makedirs(self.spill_folder, exist_ok=True)
+        spill_folder = tempfile.mkdtemp(prefix="pay_journal_", dir=self.spill_folder)
+        try:
+            partitions = self.partition_pay_journal(spill_folder)
+            for cost_centre in sorted(partitions, key=str):
+                partition_df = self.read_partition(partitions[cost_centre])
+                merged_data = self.merge_tables((partition_df, job_classifications_df, charge_sheet_df))
+                self.row_counts["merged"] += len(merged_data)
+                for name, filtered_data in self.split_cost_centres(merged_data, charge_sheet_df):
+                    invoice = self.process_cost_centre(name, filtered_data)
+                    if invoice is not None:
+                        invoices[invoice[0]] = None
+                os.remove(partitions[cost_centre])
+        finally:
+            shutil.rmtree(spill_folder, ignore_errors=True)
 
-            # Create a list of CSV files in the output folder
-            output_folder = "output_folder"
-            csv_files = [f for f in os.listdir(output_folder) if f.endswith(".csv")]
-
-            for csv_file in csv_files:
-                # Read data from the CSV file in the output folder
-                data = pd.read_csv(os.path.join(output_folder, csv_file), header=[0])
-
-                final_data = []
-                total_amount = 0
-                prefix = csv_file.split("-")
-
-                for src_col, target_col in mapping.items():
-                    if src_col in data.columns and target_col in data.columns:
-                        unit = data[src_col].values
-                        rate = data[target_col].values
-
-                        if not any(unit) or not any(rate):
-                            continue
-
-                        result = unit * rate
-                        description = (
-                            data["Job Classification"]
-                            + "-"
-                            + prefix[0]
-                            + "-"
-                            + target_col
-                            + "-"
-                            + data["Given Names"]
-                            + "-"
-                            + data["Last Name"]
-                        )
-
-                        data["Given Names"] = data["Given Names"].values
-                        data["Cost Centre"] = data["Cost Centre"].values
-                        data["Last Name"] = data["Last Name"].values
-                        split_names = data["Payroll Name Selection"].str.split("-", expand=True)
-
-                        period_end_date = datetime.strptime(data["Period End Date"].iloc[0], "%d/%m/%Y")
-                        serviced_start_date = period_end_date - pd.DateOffset(days=6)
-                        serviced_period = f"{serviced_start_date.strftime('%d/%m/%Y')} - {period_end_date.strftime('%d/%m/%Y')}"
-                        for i in range(len(result)):
-                            serviced = serviced_period
-                            unit_value = "{:.2f}".format(unit[i])
-                            rate_value = "{:.2f}".format(rate[i])
-                            amount = "{:.2f}".format(result[i])
-
-                            total_amount += float(amount)
-
-                            row = {
-                                "Serviced": serviced,
-                                "Description": description[i],
-                                "Unit": unit_value,
-                                "Rate": rate_value,
-                                "Amount": amount,
-                                "Given Names": data["Given Names"][i],
-                                "Last Name": data["Last Name"][i],
-                                "Cost Centre": data["Cost Centre"][i],
-                                "Payroll Name": split_names[0][i],
-                            }
-                            final_data.append(row)
-
-                result_df = pd.DataFrame(final_data)
-                result_df = result_df.sort_values(by=["Given Names", "Last Name"])
-
-                # Save the invoice for the current CSV file
-                invoice_filename = os.path.splitext(csv_file)[0] + "_invoice.csv"
-                invoice_filepath = os.path.join(self.invoice_folder, invoice_filename)
-                result_df.to_csv(invoice_filepath, header=True, index=False)
+        return invoices
@@ -0,0 +1,144 @@
+import os
+import threading
+import pandas as pd
+from app.fingerprints import file_digest
+from app.matcher import OrganizationMatcher
+
+
+csv_data_directory = "./data"
+clients_data = "map_clients.csv"
+organizations_data = "organizations.csv"
+
+
+class ReferenceTable:
+    def __init__(self, file_path, build):
+        """
+        Hold one reference CSV together with the indexes built from it.
+
+        :param file_path: Path of the CSV file.
+        :param build: Callable taking the parsed DataFrame and returning the
+            cached value (the frame plus any precomputed indexes).
+        """
+        self.file_path = file_path
+        self.build = build
+        self.signature = None
+        self.digest = None
+        self.value = None
+
+    def current_signature(self):
+        stat = os.stat(self.file_path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def refresh(self):
+        """
+        Reload the table if the file changed since the last load.
+
+        The (mtime, size) signature is checked on every access; the file is
+        only hashed when that signature moves, and only re-parsed when the
+        hash differs as well.
+
+        :return: True if the table was (re)loaded, False if the cache was used.
+        """
+        signature = self.current_signature()
+        if self.value is not None and signature == self.signature:
+            return False
+
+        digest = file_digest(self.file_path)
+        if self.value is not None and digest == self.digest:
+            self.signature = signature
+            return False
+
+        self.value = self.build(pd.read_csv(self.file_path))
+        self.signature = signature
+        self.digest = digest
+        return True
+
+
+class ReferenceDataStore:
+    def __init__(self, data_directory=csv_data_directory, clients_file=clients_data,
+                 organizations_file=organizations_data):
+        """
+        Process-wide cache for map_clients.csv and organizations.csv.
+
+        :param data_directory: Directory containing the reference CSV files.
+        :param clients_file: File name of the client mapping table.
+        :param organizations_file: File name of the organizations table.
+        """
+        self._lock = threading.Lock()
+        self._clients = ReferenceTable(
+            os.path.join(data_directory, clients_file), self._build_clients
+        )
+        self._organizations = ReferenceTable(
+            os.path.join(data_directory, organizations_file), self._build_organizations
+        )
+        self.hits = 0
+        self.reloads = 0
+
+    @staticmethod
+    def _build_clients(clients_df):
+        # Keep the first row per Cost Centre, as the lookups always used .iloc[0]
+        by_cost_centre = clients_df.drop_duplicates("Cost Centre").set_index(
+            "Cost Centre", drop=False
+        )
+        return {"df": clients_df, "by_cost_centre": by_cost_centre}
+
+    @staticmethod
+    def _build_organizations(organizations_df):
+        return {"df": organizations_df, "matcher": OrganizationMatcher(organizations_df)}
+
+    def _get(self, table):
+        with self._lock:
+            if table.refresh():
+                self.reloads += 1
+            else:
+                self.hits += 1
+            return table.value
+
+    def clients(self):
+        """
+        :return: The map_clients.csv DataFrame. Treat it as read-only.
+        """
+        return self._get(self._clients)["df"]
+
+    def organizations(self):
+        """
+        :return: The organizations.csv DataFrame. Treat it as read-only.
+        """
+        return self._get(self._organizations)["df"]
+
+    def matcher(self):
+        """
+        :return: OrganizationMatcher built over the current organizations table.
+        """
+        return self._get(self._organizations)["matcher"]
+
+    def client_for(self, cost_centre):
+        """
+        Look up the client mapping row for a cost centre.
+
+        :param cost_centre: Cost Centre to look up.
+        :return: Matching row from map_clients.csv as a Series.
+        :raises KeyError: If the cost centre is not mapped.
+        """
+        by_cost_centre = self._get(self._clients)["by_cost_centre"]
+        if cost_centre not in by_cost_centre.index:
+            raise KeyError(f"Cost Centre {cost_centre!r} not found in {self._clients.file_path}")
+        return by_cost_centre.loc[cost_centre]
+
+    def digests(self):
+        """
+        :return: Tuple of the SHA-256 digests of the current clients and organizations files.
+        """
+        self._get(self._clients)
+        self._get(self._organizations)
+        return self._clients.digest, self._organizations.digest
+
+    def stats(self):
+        """
+        :return: Dictionary with cache hit and reload counts.
+        """
+        with self._lock:
+            return {"hits": self.hits, "reloads": self.reloads}
+
+
+reference_data = ReferenceDataStore()
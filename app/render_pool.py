@@ -0,0 +1,82 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class RenderResult:
+    __slots__ = ("invoice_file", "success", "duration", "error", "cached", "pdf_bytes")
+
+    def __init__(self, invoice_file, success, duration, error=None, cached=False, pdf_bytes=None):
+        """
+        Outcome of rendering a single invoice.
+
+        :param invoice_file: Name of the invoice that was rendered.
+        :param success: Whether the PDF was produced.
+        :param duration: Wall-clock render time in seconds.
+        :param error: Error message when rendering failed.
+        :param cached: Whether the PDF was reused from the PDF cache.
+        :param pdf_bytes: Size of the produced PDF in bytes.
+        """
+        self.invoice_file = invoice_file
+        self.success = success
+        self.duration = duration
+        self.error = error
+        self.cached = cached
+        self.pdf_bytes = pdf_bytes
+
+    def to_dict(self):
+        return {
+            "invoice_file": self.invoice_file,
+            "success": self.success,
+            "duration": round(self.duration, 3),
+            "error": self.error,
+            "cached": self.cached,
+            "pdf_bytes": self.pdf_bytes,
+        }
+
+
+class RenderScheduler:
+    def __init__(self, max_workers=None, max_pending=None):
+        """
+        Run invoice renders on a bounded worker pool.
+
+        Each render spends almost all of its time waiting on a wkhtmltopdf
+        subprocess, so threads are enough to keep several renders in flight.
+
+        :param max_workers: Number of concurrent renders (defaults to the CPU count).
+        :param max_pending: Maximum number of submitted but unfinished renders
+            (defaults to twice max_workers). Submission blocks when it is reached.
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.max_workers * 2
+
+    def run(self, render, invoice_files):
+        """
+        Render every invoice and collect a result for each one.
+
+        :param render: Callable taking an invoice file name; raises on failure and
+            returns True when the PDF was served from a cache.
+        :param invoice_files: Iterable of invoice file names.
+        :return: List of RenderResult objects in submission order.
+        """
+        slots = threading.BoundedSemaphore(self.max_pending)
+
+        def timed_render(invoice_file):
+            start = time.perf_counter()
+            try:
+                cached = bool(render(invoice_file))
+                result = RenderResult(invoice_file, True, time.perf_counter() - start, cached=cached)
+            except Exception as e:
+                result = RenderResult(invoice_file, False, time.perf_counter() - start, str(e))
+            finally:
+                slots.release()
+            return result
+
+        futures = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for invoice_file in invoice_files:
+                slots.acquire()
+                futures.append(executor.submit(timed_render, invoice_file))
+
+        return [future.result() for future in futures]
@@ -0,0 +1,144 @@
+import os
+import numpy as np
+import pandas as pd
+from app.processor import DataProcessor
+
+
+class SyntheticPayRun:
+    # Upload file names in the order the pay-run endpoints expect them
+    upload_file_names = [
+        "Pay Journal (CSV).csv",
+        "Daily Cost Detail - Actual (CSV).csv",
+        "Charge Sheet.csv",
+        "Job_Classifications.csv",
+    ]
+
+    job_classifications = ["Miner", "Fitter", "Electrician", "Labourer", "Shotcreter", "Supervisor"]
+    last_names = ["Smith", "Jones", "Brown", "Lee", "Nguyen", "Wilson", "Taylor", "Martin"]
+    given_names = ["Ann", "Bob", "Cat", "Dan", "Eve", "Finn", "Gus", "Hana", "Ivy", "Jack"]
+
+    def __init__(self, employees=200, cost_centres=10, pay_items=8, entities=3, seed=0,
+                 period_end_date="14/01/2024"):
+        """
+        Generate a realistic fake pay run with matching reference data.
+
+        :param employees: Number of employees in the Pay Journal.
+        :param cost_centres: Number of cost centres the employees are spread over.
+        :param pay_items: Number of Pay Journal item columns, taken in order from
+            DataProcessor.pay_item_mapping (at most its length).
+        :param entities: Number of contract entities (payroll names / organizations).
+        :param seed: Seed of the random generator; equal parameters give equal files.
+        :param period_end_date: Pay period end date in dd/mm/YYYY format.
+        """
+        self.employees = employees
+        self.cost_centres = [f"SYN-C{number:03d}" for number in range(1, cost_centres + 1)]
+        self.pay_items = list(DataProcessor.pay_item_mapping)[:pay_items]
+        self.entities = [f"Synthetic Entity {chr(ord('A') + number % 26) * (number // 26 + 1)} Pty Ltd"
+                         for number in range(entities)]
+        self.seed = seed
+        self.period_end_date = period_end_date
+
+    def employees_frame(self, rng):
+        numbers = np.arange(100000, 100000 + self.employees)
+        return pd.DataFrame({
+            "Employee No.": numbers,
+            "Last Name": rng.choice(self.last_names, self.employees),
+            "Given Names": rng.choice(self.given_names, self.employees) + " " + numbers.astype(str),
+            "Job Classification": rng.choice(self.job_classifications, self.employees),
+        })
+
+    def pay_journal_frame(self, rng, employees_df):
+        # Most employees have one Pay Journal row, some are split over two cost centres
+        rows = employees_df.loc[employees_df.index.repeat(rng.choice([1, 1, 1, 2], len(employees_df)))]
+        rows = rows.reset_index(drop=True)
+        row_count = len(rows)
+        journal_df = pd.DataFrame({
+            "Employee No.": rows["Employee No."],
+            "Last Name": rows["Last Name"],
+            "Given Names": rows["Given Names"],
+            "Cost Centre": rng.choice(self.cost_centres, row_count),
+            "Payroll Name Selection": pd.Series(rng.choice(self.entities, row_count)) + " - Weekly",
+            "Period End Date": self.period_end_date,
+        })
+        hours = np.array([0, 1, 2, 3.25, 4, 7.5, 8, 10, 38])
+        for item in self.pay_items:
+            values = rng.choice(hours, row_count)
+            # Roughly half of the cells are left empty, as in real exports
+            journal_df[item] = np.where(rng.random(row_count) < 0.5, np.nan, values)
+        return journal_df
+
+    def charge_sheet_frame(self, rng):
+        rate_columns = list(dict.fromkeys(DataProcessor.pay_item_mapping[item] for item in self.pay_items))
+        charge_sheet_df = pd.DataFrame({"Job Classification": self.job_classifications})
+        for column in rate_columns:
+            charge_sheet_df[column] = rng.uniform(10, 150, len(self.job_classifications)).round(2)
+        return charge_sheet_df
+
+    def clients_frame(self):
+        return pd.DataFrame({
+            "Cost Centre": self.cost_centres,
+            "Search Entity": [f"Synthetic Client {cost_centre}" for cost_centre in self.cost_centres],
+            "Invoice No.": "",
+            "Billing Address": [f"Synthetic Client {cost_centre}" for cost_centre in self.cost_centres],
+            "Address": [f"Level {number % 20 + 1}, {number} Example Street, Melbourne, VIC 3000"
+                        for number in range(1, len(self.cost_centres) + 1)],
+            "Project Location": [cost_centre.split("-")[1] for cost_centre in self.cost_centres],
+            "Contract Number": [f"SYN-{number:04d}" for number in range(1, len(self.cost_centres) + 1)],
+            "Terms": "30 Days EOM",
+        })
+
+    def organizations_frame(self):
+        return pd.DataFrame({
+            "Uuid": [f"00000000-0000-4000-8000-{number:012d}" for number in range(len(self.entities))],
+            "Contract Entity": self.entities,
+            "Line 1 ": "ABN: 00 000 000 000",
+            "Line 2": "PO Box 1",
+            "Line 3": "MELBOURNE, VIC 3000",
+            "Bank Line 1": "Bank Acc Details: Example Bank",
+            "Bank Line 2": self.entities,
+            "Bank Line 3": "BSB: 000-000",
+            "Bank Line 4": "ACC: 000000000",
+        })
+
+    def write(self, directory):
+        """
+        Write the upload files and reference data of the pay run.
+
+        Uploads go to <directory>/uploads under the names used by the
+        pay-run endpoints; map_clients.csv and organizations.csv go to
+        <directory>/data.
+
+        :param directory: Folder to write to.
+        :return: Dictionary with the "uploads" paths (in endpoint order), the
+            "data_directory" and row counts of the generated tables.
+        """
+        rng = np.random.default_rng(self.seed)
+        upload_folder = os.path.join(directory, "uploads")
+        data_directory = os.path.join(directory, "data")
+        os.makedirs(upload_folder, exist_ok=True)
+        os.makedirs(data_directory, exist_ok=True)
+        paths = [os.path.join(upload_folder, name) for name in self.upload_file_names]
+
+        employees_df = self.employees_frame(rng)
+        journal_df = self.pay_journal_frame(rng, employees_df)
+        with open(paths[0], "w", newline="") as f:
+            # Report title row, skipped by DataReader.read_csv(skip_rows=1)
+            f.write("Pay Journal Report\n")
+            journal_df.to_csv(f, index=False)
+
+        pd.DataFrame({"Date": [self.period_end_date], "Cost": [0]}).to_csv(paths[1], index=False)
+        self.charge_sheet_frame(rng).to_csv(paths[2], index=False)
+        employees_df.rename(columns={"Employee No.": "Employee Number", "Given Names": "First Name"}).to_csv(
+            paths[3], index=False
+        )
+        self.clients_frame().to_csv(os.path.join(data_directory, "map_clients.csv"), index=False)
+        self.organizations_frame().to_csv(os.path.join(data_directory, "organizations.csv"), index=False)
+
+        return {
+            "uploads": paths,
+            "data_directory": data_directory,
+            "pay_journal_rows": len(journal_df),
+            "employees": self.employees,
+            "cost_centres": len(self.cost_centres),
+            "pay_items": len(self.pay_items),
+        }
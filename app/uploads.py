@@ -0,0 +1,101 @@
+import hashlib
+import os
+
+
+class UploadError(ValueError):
+    """
+    Base class for rejected uploads.
+    """
+
+
+class UploadTooLargeError(UploadError):
+    """
+    Raised when an upload exceeds the configured size limit.
+    """
+
+
+class UploadTypeError(UploadError):
+    """
+    Raised when the contents of an upload do not match its extension.
+    """
+
+
+def detect_file_type(head):
+    """
+    Detect the real type of an upload from its first bytes.
+
+    :param head: First bytes of the file.
+    :return: "xlsx" for ZIP based workbooks, "csv" for text, or None if unknown.
+    """
+    if head.startswith(b"PK\x03\x04"):
+        return "xlsx"
+    if b"\x00" in head:
+        return None
+    for encoding in ("utf-8-sig", "cp1252"):
+        try:
+            text = head.decode(encoding)
+            break
+        except UnicodeDecodeError as e:
+            # A multi-byte character may be cut off at the end of the sample
+            if encoding == "utf-8-sig" and e.start >= len(head) - 3:
+                text = head[:e.start].decode(encoding)
+                break
+    else:
+        return None
+    printable = sum(char.isprintable() or char in "\r\n\t" for char in text)
+    return "csv" if not text or printable / len(text) > 0.95 else None
+
+
+async def save_upload(upload_file, destination, expected_type=None, max_bytes=None,
+                      chunk_size=1024 * 1024):
+    """
+    Stream an UploadFile to disk in fixed-size chunks, hashing it on the way.
+
+    :param upload_file: FastAPI UploadFile to save.
+    :param destination: Path of the file to write.
+    :param expected_type: Type the contents must have ("csv" or "xlsx"), or None to skip the check.
+    :param max_bytes: Maximum allowed size in bytes, or None for no limit.
+    :param chunk_size: Number of bytes read and written at a time.
+    :return: Dictionary with the file name, path, size, SHA-256 digest and detected type.
+    :raises UploadTooLargeError: If the upload is larger than max_bytes.
+    :raises UploadTypeError: If the contents do not match expected_type.
+    """
+    if max_bytes is not None and upload_file.size is not None and upload_file.size > max_bytes:
+        raise UploadTooLargeError(
+            f"'{upload_file.filename}' is {upload_file.size} bytes; the limit is {max_bytes} bytes"
+        )
+
+    digest = hashlib.sha256()
+    size = 0
+    file_type = None
+    try:
+        with open(destination, "wb") as f:
+            while True:
+                chunk = await upload_file.read(chunk_size)
+                if not chunk:
+                    break
+                if size == 0:
+                    file_type = detect_file_type(chunk[:8192])
+                    if expected_type is not None and file_type != expected_type:
+                        raise UploadTypeError(
+                            f"'{upload_file.filename}' does not contain {expected_type} data"
+                        )
+                size += len(chunk)
+                if max_bytes is not None and size > max_bytes:
+                    raise UploadTooLargeError(
+                        f"'{upload_file.filename}' exceeds the limit of {max_bytes} bytes"
+                    )
+                digest.update(chunk)
+                f.write(chunk)
+    except UploadError:
+        os.remove(destination)
+        raise
+
+    return {
+        "filename": upload_file.filename,
+        "path": destination,
+        "size": size,
+        "sha256": digest.hexdigest(),
+        "type": file_type,
+    }
+
@@ -0,0 +1,233 @@
+import json
+import os
+import time
+import uuid
+import requests
+from requests.adapters import HTTPAdapter
+
+
+default_webhook_url = "https://hook.eu2.make.com/e5ql7jh487prsm5551jegt98wr2l463p"
+
+
+class MultipartStream:
+    def __init__(self, fields, files, chunk_size=64 * 1024):
+        """
+        multipart/form-data request body that streams file parts from disk.
+
+        The body length is known up front, so requests sends it with a
+        Content-Length header instead of chunked encoding, and the stream can
+        be iterated again when a delivery is retried.
+
+        :param fields: List of (name, value) string form fields.
+        :param files: List of (name, file name, file path, content type) file parts.
+        :param chunk_size: Number of bytes read from disk at a time.
+        """
+        self.boundary = uuid.uuid4().hex
+        self.chunk_size = chunk_size
+        self.parts = []
+        for name, value in fields:
+            header = self._part_header(f'form-data; name="{name}"')
+            self.parts.append((header, value.encode("utf-8"), None))
+        for name, file_name, file_path, content_type in files:
+            header = self._part_header(
+                f'form-data; name="{name}"; filename="{file_name}"', content_type
+            )
+            self.parts.append((header, None, file_path))
+        self.closing = f"--{self.boundary}--\r\n".encode("ascii")
+
+    def _part_header(self, disposition, content_type=None):
+        header = f"--{self.boundary}\r\nContent-Disposition: {disposition}\r\n"
+        if content_type:
+            header += f"Content-Type: {content_type}\r\n"
+        return (header + "\r\n").encode("utf-8")
+
+    @property
+    def content_type(self):
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self):
+        length = len(self.closing)
+        for header, value, file_path in self.parts:
+            body_length = len(value) if file_path is None else os.path.getsize(file_path)
+            length += len(header) + body_length + 2
+        return length
+
+    def __iter__(self):
+        for header, value, file_path in self.parts:
+            yield header
+            if file_path is None:
+                yield value
+            else:
+                with open(file_path, "rb") as f:
+                    for chunk in iter(lambda: f.read(self.chunk_size), b""):
+                        yield chunk
+            yield b"\r\n"
+        yield self.closing
+
+
+class WebhookSender:
+    def __init__(self, webhook_url=default_webhook_url, max_batch_bytes=50 * 1024 ** 2,
+                 max_retries=3, backoff=1.0, timeout=120, session=None):
+        """
+        Deliver invoice summaries and PDFs to the make.com webhook.
+
+        :param webhook_url: URL the multipart requests are posted to.
+        :param max_batch_bytes: Maximum total PDF size per request; larger runs
+            are split into several batches (a single larger PDF gets its own batch).
+        :param max_retries: Number of retries for a batch after the first attempt.
+        :param backoff: Delay in seconds before the first retry, doubled on every retry.
+        :param timeout: Seconds to wait for the webhook to respond.
+        :param session: Optional requests.Session; one pooled session is created by default.
+        """
+        self.webhook_url = webhook_url
+        self.max_batch_bytes = max_batch_bytes
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        if session is None:
+            session = requests.Session()
+            session.mount("https://", HTTPAdapter(pool_maxsize=4))
+            session.mount("http://", HTTPAdapter(pool_maxsize=4))
+        self.session = session
+
+    def make_batches(self, records, files):
+        """
+        Split invoice records and their PDFs into size-bounded batches.
+
+        :param records: List of invoice summary dictionaries.
+        :param files: List of (file name, file path, content type), aligned with records.
+        :return: List of (records, files) batches.
+        """
+        if not files:
+            return [(list(records), [])]
+
+        batches = []
+        batch_records, batch_files, batch_bytes = [], [], 0
+        for record, file in zip(records, files):
+            size = os.path.getsize(file[1])
+            if batch_files and batch_bytes + size > self.max_batch_bytes:
+                batches.append((batch_records, batch_files))
+                batch_records, batch_files, batch_bytes = [], [], 0
+            batch_records.append(record)
+            batch_files.append(file)
+            batch_bytes += size
+        batches.append((batch_records, batch_files))
+        return batches
+
+    @staticmethod
+    def idempotency_key(run_id, index):
+        """
+        :param run_id: Identifier of the pay run.
+        :param index: Position of the batch.
+        :return: Key identifying the batch across delivery attempts.
+        """
+        return f"{run_id}-{index}"
+
+    @staticmethod
+    def build_body(records, files, index, count, idempotency_key=None):
+        """
+        Assemble the multipart request body of one batch.
+
+        :param records: Invoice summary dictionaries of the batch.
+        :param files: (file name, file path, content type) tuples of the batch.
+        :param index: Position of the batch.
+        :param count: Total number of batches in the run.
+        :param idempotency_key: Key added to the payload so the receiver can
+            drop a batch it already processed.
+        :return: MultipartStream with the "fulldata" JSON field and the PDFs.
+        """
+        payload = {"data": records}
+        if idempotency_key is not None:
+            payload["idempotency_key"] = idempotency_key
+        if count > 1:
+            payload["batch"] = {"index": index, "count": count}
+        return MultipartStream(
+            [("fulldata", json.dumps(payload))],
+            [("file_data", file_name, file_path, content_type)
+             for file_name, file_path, content_type in files],
+        )
+
+    def send_batch(self, records, files, index, count, run_id):
+        """
+        Post one batch, retrying transient failures with exponential backoff.
+
+        Connection errors, timeouts, HTTP 429 and 5xx responses are retried;
+        other HTTP errors fail the batch immediately. The POST is not
+        idempotent by itself, so every attempt carries the same idempotency
+        key, in the payload and in the Idempotency-Key header, for the
+        receiver to deduplicate a batch whose earlier attempt did arrive.
+
+        :param run_id: Identifier of the pay run, part of the idempotency key.
+        :return: Dictionary describing the delivery of the batch; "seconds"
+            is the latency of the last attempt.
+        """
+        key = self.idempotency_key(run_id, index)
+        body = self.build_body(records, files, index, count, key)
+        status = {
+            "batch": index,
+            "idempotency_key": key,
+            "invoices": len(records),
+            "bytes": len(body),
+            "attempts": 0,
+            "seconds": 0.0,
+            "status_code": None,
+            "success": False,
+            "error": None,
+        }
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+            status["attempts"] = attempt + 1
+            start = time.perf_counter()
+            try:
+                response = self.session.post(
+                    self.webhook_url,
+                    data=body,
+                    headers={"Content-Type": body.content_type, "Idempotency-Key": key},
+                    timeout=self.timeout,
+                )
+                status["seconds"] = round(time.perf_counter() - start, 3)
+                status["status_code"] = response.status_code
+                response.raise_for_status()  # Raise an exception for HTTP errors
+                status["success"] = True
+                status["error"] = None
+                return status
+            except requests.exceptions.HTTPError as e:
+                status["error"] = str(e)
+                if response.status_code != 429 and response.status_code < 500:
+                    return status
+            except requests.exceptions.RequestException as e:
+                status["seconds"] = round(time.perf_counter() - start, 3)
+                status["error"] = str(e)
+
+        return status
+
+    def send_data_to_webhook(self, data: dict, files: dict, run_id=None):
+        """
+        Send the invoice summaries and PDFs to the webhook in batches.
+
+        :param data: Dictionary with the invoice summaries under "data".
+        :param files: Dictionary with (file name, file path, content type) tuples
+            under "files", aligned with data["data"].
+        :param run_id: Identifier of the pay run, used in the idempotency key
+            of every batch; a random one is used if not given.
+        :return: Dictionary with an overall message and a status per batch.
+        """
+        if run_id is None:
+            run_id = uuid.uuid4().hex
+        batches = self.make_batches(data["data"], files["files"])
+        statuses = [
+            self.send_batch(records, batch_files, index, len(batches), run_id)
+            for index, (records, batch_files) in enumerate(batches)
+        ]
+        failed = [status for status in statuses if not status["success"]]
+
+        if not failed:
+            message = "Data sent to the webhook successfully"
+        else:
+            message = (
+                f"Failed to send data to the webhook: {len(failed)} of {len(statuses)} "
+                f"batches failed ({failed[0]['error']})"
+            )
+        return {"message": message, "batches": statuses}
@@ -0,0 +1,102 @@
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+
+
+class RunWorkspace:
+    def __init__(self, root, run_id):
+        """
+        Folder layout of a single pay run.
+
+        Every stage reads and writes inside <root>/<run_id>, so concurrent
+        runs never see each other's uploads, invoices or PDFs.
+
+        :param root: Folder holding all run workspaces.
+        :param run_id: Identifier of the run.
+        """
+        if not re.fullmatch(r"[A-Za-z0-9_-]+", run_id):
+            raise ValueError(f"Invalid run id {run_id!r}")
+        self.run_id = run_id
+        self.path = os.path.join(root, run_id)
+        self.upload_folder = os.path.join(self.path, "uploads")
+        self.output_folder = os.path.join(self.path, "output_folder")
+        self.invoice_folder = os.path.join(self.path, "invoice_folder")
+        self.final_folder = os.path.join(self.path, "final_folder")
+
+    def create(self):
+        """
+        Create the upload, invoice and PDF folders of the workspace.
+
+        :return: The workspace.
+        """
+        for folder in [self.upload_folder, self.invoice_folder, self.final_folder]:
+            os.makedirs(folder, exist_ok=True)
+        return self
+
+    def exists(self):
+        return os.path.isdir(self.path)
+
+
+class WorkspaceManager:
+    def __init__(self, root="workspaces", retention=7 * 24 * 3600, cleanup_interval=3600):
+        """
+        Create run workspaces and remove them once they expire.
+
+        :param root: Folder holding all run workspaces.
+        :param retention: Seconds a workspace is kept after it was last modified.
+        :param cleanup_interval: Minimum number of seconds between cleanup passes.
+        """
+        self.root = root
+        self.retention = retention
+        self.cleanup_interval = cleanup_interval
+        self._last_cleanup = 0
+        self._lock = threading.Lock()
+
+    def new(self):
+        """
+        :return: A freshly created RunWorkspace with a random run id.
+        """
+        return RunWorkspace(self.root, uuid.uuid4().hex).create()
+
+    def get(self, run_id):
+        """
+        :param run_id: Identifier of an existing run.
+        :return: The RunWorkspace, or None if it does not exist (or has been cleaned up).
+        """
+        try:
+            workspace = RunWorkspace(self.root, run_id)
+        except ValueError:
+            return None
+        return workspace if workspace.exists() else None
+
+    def cleanup(self, force=False, keep=()):
+        """
+        Remove workspaces not modified within the retention period.
+
+        Runs at most once per cleanup_interval unless force is set.
+
+        :param force: Run even if the previous pass was recent.
+        :param keep: Run ids that must not be removed (e.g. unfinished runs).
+        :return: List of removed run ids.
+        """
+        now = time.time()
+        with self._lock:
+            if not force and now - self._last_cleanup < self.cleanup_interval:
+                return []
+            self._last_cleanup = now
+
+        if not os.path.isdir(self.root):
+            return []
+
+        removed = []
+        cutoff = now - self.retention
+        for entry in os.scandir(self.root):
+            if not entry.is_dir() or entry.name in keep:
+                continue
+            if entry.stat().st_mtime < cutoff:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed.append(entry.name)
+        return removed
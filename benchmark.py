@@ -0,0 +1,258 @@
+"""
+End-to-end benchmark of the pay-run pipeline on synthetic inputs.
+
+Generates a fake pay run with app.synthetic, then times every stage
+separately and writes a JSON report:
+
+    python benchmark.py --employees 2000 --cost-centres 40 --pay-items 12 --report bench_report.json
+
+PDFs are rendered with a mock renderer that writes the HTML to the PDF path,
+so wkhtmltopdf is not needed; pass --renderer wkhtmltopdf to time the real one.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+
+repo_root = os.path.dirname(os.path.abspath(__file__))
+
+
+def mock_html_to_pdf(html, pdf_output, timeout=None, options=None):
+    """
+    Stand-in for html_to_pdf that writes the HTML itself as the "PDF".
+    """
+    with open(pdf_output, "w") as f:
+        f.write(html)
+
+
+class StageTimer:
+    def __init__(self, trace_memory=True):
+        """
+        Collect wall time and peak traced memory of named stages.
+
+        :param trace_memory: Record the peak Python allocation of each stage with tracemalloc.
+        """
+        self.trace_memory = trace_memory
+        self.stages = {}
+
+    def run(self, name, func, *args, **kwargs):
+        """
+        Run func as stage name and record its duration and peak memory.
+
+        :return: The return value of func.
+        """
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        value = func(*args, **kwargs)
+        duration = time.perf_counter() - start
+        stage = self.stages.setdefault(name, {"seconds": [], "peak_traced_bytes": []})
+        stage["seconds"].append(duration)
+        if self.trace_memory:
+            stage["peak_traced_bytes"].append(tracemalloc.get_traced_memory()[1])
+        return value
+
+    def summary(self):
+        return {
+            name: {
+                "seconds": stage["seconds"],
+                "best_seconds": min(stage["seconds"]),
+                "median_seconds": statistics.median(stage["seconds"]),
+                "peak_traced_bytes": max(stage["peak_traced_bytes"], default=None),
+            }
+            for name, stage in self.stages.items()
+        }
+
+
+def run_once(timer, generated, iteration, renderer, chunk_rows=0):
+    """
+    Run every pipeline stage once inside the current working directory.
+
+    :return: Dictionary with invoice and line counts of the run.
+    """
+    from app.csv_reader import DataReader
+    from app.generate_pdf import InvoiceProcessor
+    from app.processor import DataProcessor
+    from app.webhook import WebhookSender
+
+    run_folder = f"run_{iteration}"
+    invoice_folder = os.path.join(run_folder, "invoice_folder")
+    final_folder = os.path.join(run_folder, "final_folder")
+    os.makedirs(final_folder, exist_ok=True)
+    pay_journal_path, _, charge_sheet_path, job_classifications_path = generated["uploads"]
+
+    def ingest():
+        return (
+            DataReader(pay_journal_path).read_table(
+                skip_rows=1, columns=DataProcessor.pay_journal_columns, dtypes=DataProcessor.pay_journal_dtypes
+            ),
+            DataReader(job_classifications_path).read_table(columns=DataProcessor.job_classification_columns),
+            DataReader(charge_sheet_path).read_table(columns=DataProcessor.charge_sheet_columns),
+        )
+
+    frames = timer.run("ingest", ingest)
+
+    def build_invoice_lines():
+        data_processor = DataProcessor.from_frames(*frames)
+        tables = data_processor.load_tables()
+        merged_data = data_processor.merge_tables(tables)
+        return [
+            data_processor.build_invoice_lines(filtered_data, cost_centre.replace(" ", "_"))
+            for cost_centre, filtered_data in data_processor.split_cost_centres(merged_data, tables[2])
+        ]
+
+    invoice_lines = timer.run("invoice_lines", build_invoice_lines)
+
+    if chunk_rows:
+        # Streaming mode reads the Pay Journal itself, so its read is part of this stage
+        pay_journal_chunks = DataReader(pay_journal_path).iter_chunks(
+            chunk_rows, skip_rows=1, columns=DataProcessor.pay_journal_columns,
+            dtypes=DataProcessor.pay_journal_dtypes,
+        )
+        data_processor = DataProcessor.from_chunks(pay_journal_chunks, *frames[1:], invoice_folder=invoice_folder)
+    else:
+        data_processor = DataProcessor.from_frames(*frames, invoice_folder=invoice_folder)
+    timer.run("process_data", data_processor.process_data)
+
+    invoice_processor = InvoiceProcessor(
+        invoice_folder,
+        final_folder,
+        pdf_renderer=mock_html_to_pdf if renderer == "mock" else None,
+    )
+    render_results = timer.run("render_pdfs", invoice_processor.process_invoices)
+    failed = [result.to_dict() for result in render_results if not result.success]
+    if failed:
+        raise RuntimeError(f"Rendering failed: {failed}")
+
+    summaries = timer.run("summarise", invoice_processor.summaries, render_results)
+    results = [summary.to_record() for summary in summaries]
+    files_list = [summary.pdf_file() for summary in summaries]
+
+    def assemble_webhook_payload():
+        # Build and drain every multipart body exactly as a delivery would, without posting it
+        sender = WebhookSender()
+        batches = sender.make_batches(results, files_list)
+        total_bytes = 0
+        for index, (records, batch_files) in enumerate(batches):
+            for chunk in sender.build_body(records, batch_files, index, len(batches)):
+                total_bytes += len(chunk)
+        return total_bytes
+
+    payload_bytes = timer.run("webhook_payload", assemble_webhook_payload)
+
+    return {
+        "invoices": len(render_results),
+        "invoice_lines": sum(len(lines) for lines in invoice_lines),
+        "summaries": len(results),
+        "webhook_payload_bytes": payload_bytes,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--employees", type=int, default=500)
+    parser.add_argument("--cost-centres", type=int, default=20)
+    parser.add_argument("--pay-items", type=int, default=8)
+    parser.add_argument("--entities", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=1, help="Number of timed runs per stage")
+    parser.add_argument("--renderer", choices=["mock", "wkhtmltopdf"], default="mock")
+    parser.add_argument("--chunk-rows", type=int, default=0,
+                        help="Run process_data in streaming mode with this many Pay Journal rows per chunk")
+    parser.add_argument("--no-trace-memory", action="store_true",
+                        help="Skip tracemalloc (lower overhead, no per-stage peak memory)")
+    parser.add_argument("--workdir", help="Folder for generated inputs and outputs (default: a temporary folder)")
+    parser.add_argument("--keep", action="store_true", help="Keep the work folder")
+    parser.add_argument("--report", default="bench_report.json", help="Path of the JSON report")
+    args = parser.parse_args(argv)
+
+    from app.synthetic import SyntheticPayRun
+
+    report_path = os.path.abspath(args.report)
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="payrun_bench_"))
+    os.makedirs(workdir, exist_ok=True)
+
+    generator = SyntheticPayRun(
+        employees=args.employees,
+        cost_centres=args.cost_centres,
+        pay_items=args.pay_items,
+        entities=args.entities,
+        seed=args.seed,
+    )
+    start = time.perf_counter()
+    generated = generator.write(workdir)
+    generate_seconds = time.perf_counter() - start
+
+    # Templates and reference data are resolved relative to the working directory
+    templates_link = os.path.join(workdir, "templates")
+    if not os.path.exists(templates_link):
+        os.symlink(os.path.join(repo_root, "templates"), templates_link)
+    sys.path.insert(0, repo_root)
+    previous_cwd = os.getcwd()
+    os.chdir(workdir)
+
+    timer = StageTimer(trace_memory=not args.no_trace_memory)
+    if timer.trace_memory:
+        tracemalloc.start()
+    try:
+        counts = [
+            run_once(timer, generated, iteration, args.renderer, args.chunk_rows)
+            for iteration in range(args.repeat)
+        ]
+    finally:
+        if timer.trace_memory:
+            tracemalloc.stop()
+        os.chdir(previous_cwd)
+        if not args.keep and not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    import numpy
+    import pandas
+
+    report = {
+        "parameters": {
+            "employees": args.employees,
+            "cost_centres": args.cost_centres,
+            "pay_items": generated["pay_items"],
+            "entities": args.entities,
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "renderer": args.renderer,
+            "chunk_rows": args.chunk_rows,
+            "trace_memory": timer.trace_memory,
+        },
+        "inputs": {
+            "pay_journal_rows": generated["pay_journal_rows"],
+            "generate_seconds": generate_seconds,
+        },
+        "outputs": counts[-1],
+        "stages": timer.summary(),
+        # ru_maxrss is reported in KiB on Linux
+        "peak_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": numpy.__version__,
+            "pandas": pandas.__version__,
+            "cpu_count": os.cpu_count(),
+        },
+    }
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+
+    for name, stage in report["stages"].items():
+        print(f"{name:<16} {stage['best_seconds']:8.3f}s")
+    print(f"Report written to {report_path}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,27 @@
-from fastapi import FastAPI, UploadFile, HTTPException
-from app.processor import DataProcessor
-from app.generate_pdf import InvoiceProcessor
+# pandas, numpy, openpyxl, pdfkit and requests are only imported by warm_up or on
+# first use (see the imports inside the functions below), so the app starts quickly
+from fastapi import FastAPI, UploadFile, HTTPException, Query, Request, Response
+from app.assets import load_logo_data_uri
+from app.pdf_cache import PdfCache
+from app.fingerprints import FingerprintStore
+from app.manifest import InvoiceManifest
+from app.metrics import RunMetrics, registry
+from app.jobs import JobManager, QueueFullError, track_stage
+from app.uploads import UploadTooLargeError, UploadTypeError, save_upload
+from app.workspace import WorkspaceManager
 from pydantic import BaseModel
-from fastapi.responses import FileResponse, RedirectResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, RedirectResponse
 from fastapi.openapi.utils import get_openapi
-from typing import List
+from typing import Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import asyncio
+import cProfile
+import functools
 import os
-import openpyxl
-import pandas as pd
-import requests
-import json
+import shutil
+import threading
+import time
 
 
 class AppConfig:
@@ -21,19 +32,123 @@ class AppConfig:
     CSV_FILE_NAME = "clients_and_projects.csv"
     CLIENTS_DATA = "map_clients.csv"
     ORGANIZATIONS_DATA = "organizations.csv"
+    EXPORT_RECONCILIATION_WORKBOOK = os.environ.get("EXPORT_RECONCILIATION_WORKBOOK", "0") == "1"
+    WRITE_COST_CENTRE_CSV = os.environ.get("WRITE_COST_CENTRE_CSV", "0") == "1"
+    EXPORT_INVOICE_CSV = os.environ.get("EXPORT_INVOICE_CSV", "0") == "1"
+    # Rows per Pay Journal chunk in the bounded-memory streaming mode; 0 loads the journal at once
+    PAY_JOURNAL_CHUNK_ROWS = int(os.environ.get("PAY_JOURNAL_CHUNK_ROWS", "0"))
+    PDF_RENDER_WORKERS = int(os.environ.get("PDF_RENDER_WORKERS", "0")) or None
+    PDF_RENDER_TIMEOUT = float(os.environ.get("PDF_RENDER_TIMEOUT", "120"))
+    PDF_CACHE_DIRECTORY = os.environ.get("PDF_CACHE_DIRECTORY", "pdf_cache")
+    PDF_CACHE_MAX_BYTES = int(os.environ.get("PDF_CACHE_MAX_BYTES", str(1024 ** 3)))
+    PDF_CACHE_MAX_AGE_DAYS = float(os.environ.get("PDF_CACHE_MAX_AGE_DAYS", "30"))
+    # Unset uses app.webhook.default_webhook_url
+    WEBHOOK_URL = os.environ.get("WEBHOOK_URL")
+    WEBHOOK_MAX_BATCH_BYTES = int(os.environ.get("WEBHOOK_MAX_BATCH_BYTES", str(50 * 1024 ** 2)))
+    WEBHOOK_MAX_RETRIES = int(os.environ.get("WEBHOOK_MAX_RETRIES", "3"))
+    MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", str(100 * 1024 ** 2)))
+    WORKSPACE_ROOT = os.environ.get("WORKSPACE_ROOT", "workspaces")
+    WORKSPACE_RETENTION_HOURS = float(os.environ.get("WORKSPACE_RETENTION_HOURS", "168"))
+    JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+    JOB_QUEUE_LIMIT = int(os.environ.get("JOB_QUEUE_LIMIT", "20"))
+    INCREMENTAL_RUNS = os.environ.get("INCREMENTAL_RUNS", "0") == "1"
+    FINGERPRINT_STORE_PATH = os.environ.get(
+        "FINGERPRINT_STORE_PATH", "state/cost_centre_fingerprints.json"
+    )
+    INVOICE_MANIFEST_PATH = os.environ.get(
+        "INVOICE_MANIFEST_PATH", os.path.join(WORKSPACE_ROOT, "manifest.sqlite3")
+    )
+    PDF_CACHE_CONTROL = os.environ.get("PDF_CACHE_CONTROL", "private, max-age=3600")
+    # Folder shared by worker processes so /metrics reports all of them; unset keeps metrics per process
+    METRICS_DIRECTORY = os.environ.get("METRICS_DIRECTORY")
 
 
-app = FastAPI(swagger_ui_parameters={"defaultModelsExpandDepth": -1}, redoc_url=None)
-
 app_settings = AppConfig()
+registry.directory = app_settings.METRICS_DIRECTORY
+
+# Set once warm_up has loaded everything a pay run needs
+warm_up_done = threading.Event()
+warm_up_lock = threading.Lock()
+warm_up_state = {"started_at": None, "seconds": None, "error": None}
+
+
+@functools.lru_cache(maxsize=None)
+def get_pdf_cache():
+    return PdfCache(
+        app_settings.PDF_CACHE_DIRECTORY,
+        max_bytes=app_settings.PDF_CACHE_MAX_BYTES,
+        max_age=app_settings.PDF_CACHE_MAX_AGE_DAYS * 24 * 3600,
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def get_webhook_sender():
+    from app.webhook import WebhookSender, default_webhook_url
 
-# Check if the directory exists, and create it if it doesn't
-for directory in [app_settings.DIRECTORY_PATH, app_settings.ONE_MORE]:
-    os.makedirs(directory, exist_ok=True)
+    return WebhookSender(
+        app_settings.WEBHOOK_URL or default_webhook_url,
+        max_batch_bytes=app_settings.WEBHOOK_MAX_BATCH_BYTES,
+        max_retries=app_settings.WEBHOOK_MAX_RETRIES,
+    )
+
+
+def create_directories():
+    for directory in [app_settings.WORKSPACE_ROOT, app_settings.PDF_CACHE_DIRECTORY]:
+        os.makedirs(directory, exist_ok=True)
+
+
+def warm_up():
+    """
+    Load everything a pay run needs: the pandas/openpyxl/pdfkit/requests
+    modules, the reference CSVs with their indexes, the compiled invoice
+    template, the company logo and the shared PDF cache and webhook session.
+
+    Runs once per process. The prefork launcher (serve.py) calls it before
+    forking, so the workers share the loaded state copy-on-write; otherwise
+    it runs in the background after startup. Does not start any threads.
+
+    :raises FileNotFoundError: If the company logo asset is missing.
+    """
+    with warm_up_lock:
+        if warm_up_done.is_set():
+            return
+        start = time.perf_counter()
+        warm_up_state["started_at"] = time.time()
+        create_directories()
+        # Invoices must not be rendered without the logo, so this is fatal
+        load_logo_data_uri()
+        try:
+            import app.csv_reader
+            import app.processor
+            from app.generate_pdf import template_env, template_name
+            from app.reference_data import reference_data
+
+            reference_data.clients()
+            reference_data.matcher()
+            template_env.get_template(template_name)
+            get_pdf_cache()
+            get_webhook_sender()
+        except Exception as e:
+            # Not fatal: whatever failed is loaded again on first use
+            warm_up_state["error"] = str(e)
+            print(f"Warm-up failed: {e}")
+        warm_up_state["seconds"] = round(time.perf_counter() - start, 3)
+        warm_up_done.set()
 
-# Mount the directories as static directories
-app.mount("/pdfs", StaticFiles(directory=app_settings.DIRECTORY_PATH), name="pdfs")
-pdf_folder = "final_folder"  # This is the folder where your PDFs are stored
+
+@asynccontextmanager
+async def lifespan(app):
+    create_directories()
+    # Refuse to start without the logo instead of rendering invoices without it
+    load_logo_data_uri()
+    if not warm_up_done.is_set():
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    cleanup_task = asyncio.create_task(cleanup_periodically())
+    yield
+    cleanup_task.cancel()
+
+
+app = FastAPI(swagger_ui_parameters={"defaultModelsExpandDepth": -1}, redoc_url=None, lifespan=lifespan)
 
 
 class FileExtensionValidator:
@@ -43,103 +158,144 @@ class FileExtensionValidator:
         return ext in valid_extensions
 
 
-class WebhookSender:
-    @staticmethod
-    def send_data_to_webhook(data: dict, files: dict):
-        webhook_url = "https://hook.eu2.make.com/e5ql7jh487prsm5551jegt98wr2l463p"
-        try:
-            files_data = [
-                ("file_data", (file_name, file_data, content_type))
-                for file_name, file_data, content_type in files["files"]
-            ]
-            response = requests.post(
-                webhook_url, data={"fulldata": json.dumps(data)}, files=files_data
-            )
-            response.raise_for_status()  # Raise an exception for HTTP errors
+class InvoiceRenderResult(BaseModel):
+    invoice_file: str
+    success: bool
+    duration: float
+    error: Optional[str] = None
+    cached: bool = False
 
-            return {"message": "Data sent to the webhook successfully"}
 
-        except requests.exceptions.RequestException as e:
-            return {"message": f"Failed to send data to the webhook: {str(e)}"}
+class PdfCacheCounters(BaseModel):
+    hits: int = 0
+    misses: int = 0
 
 
-class CsvProcessor:
-    @staticmethod
-    def partial_match(row, organizations_df):
-        cleaned_payroll_name = row["Payroll Name"].replace(" ", "").lower()
-        cleaned_contract_entity = (
-            organizations_df["Contract Entity"].str.replace(" ", "").str.lower()
-        )
-
-        matching_rows = organizations_df[
-            cleaned_contract_entity.str.contains(
-                cleaned_payroll_name, case=False, regex=False
-            )
-        ]
-        return matching_rows.iloc[0]
-    
-    @staticmethod
-    def calculate_amount_sum(csv_folder_path, pdf_folder_path):
-        try:
-            results = []
-            files_list = []
-
-            for file_name in os.listdir(csv_folder_path):
-                file_path = os.path.join(csv_folder_path, file_name)
-                df = pd.read_csv(file_path)
-                clients_file_path = os.path.join(
-                    app_settings.CSV_DATA_DIRECTORY, app_settings.CLIENTS_DATA
-                )
-                organization_file_path = os.path.join(
-                    app_settings.CSV_DATA_DIRECTORY, app_settings.ORGANIZATIONS_DATA
-                )
-
-                find_clients_df = pd.read_csv(clients_file_path)
-                organizations_df = pd.read_csv(organization_file_path)
-
-                matching_rows_df = df.apply(
-                    CsvProcessor.partial_match, axis=1, organizations_df=organizations_df
-                )
-
-                if not matching_rows_df.empty:
-                    filtered_data = matching_rows_df.iloc[0].to_dict()
-                    total_amount = df["Amount"].sum()
-                    index_cost_centre = df["Cost Centre"].iloc[0]
-                    search_entity = find_clients_df.loc[
-                        find_clients_df["Cost Centre"] == index_cost_centre,
-                        "Search Entity",
-                    ].values[0]
-
-                    result = {
-                        "total_amount": total_amount,
-                        "filtered_data": filtered_data,
-                        "client_name": search_entity,
-                    }
-                    results.append(result)
-
-                    pdf_file_name = os.path.splitext(file_name)[0] + ".pdf"
-                    pdf_file_path = os.path.join(pdf_folder_path, pdf_file_name)
-
-                    with open(pdf_file_path, "rb") as pdf_file:
-                        pdf_binary = pdf_file.read()
-
-                    files = (pdf_file_name, pdf_binary, "application/pdf")
-                    files_list.append(files)
-
-            return results, files_list
-        except Exception as e:
-            print("Not Working", e)
-            return [],[]
+class CostCentreChanges(BaseModel):
+    rebuilt: List[str] = []
+    skipped: List[str] = []
 
 
 class ProcessInvoicesResponse(BaseModel):
     message: str
     pdf_urls: List[str]
+    webhook_response: Optional[dict] = None
+    render_results: List[InvoiceRenderResult] = []
+    pdf_cache: PdfCacheCounters = PdfCacheCounters()
+    cost_centres: CostCentreChanges = CostCentreChanges()
+    metrics: dict = {}
+    profile_url: Optional[str] = None
+
+
+class InvoicePreview(BaseModel):
+    invoice_file: str
+    cost_centre: str
+    lines: int
+    subtotal: float
+    gst: float
+    grand_total: float
+    organization: Optional[dict] = None
+    client_name: Optional[str] = None
+    error: Optional[str] = None
+    html: Optional[str] = None
+
+
+class PreviewResponse(BaseModel):
+    message: str
+    invoices: List[InvoicePreview]
+    metrics: dict = {}
+
+
+class ManifestInvoice(BaseModel):
+    run_id: str
+    cost_centre: str
+    invoice_file: str
+    pdf_url: str
+    pdf_bytes: int
+    sha256: str
+    subtotal: float
+    gst: float
+    grand_total: float
+    created_at: float
+
+
+class InvoicePage(BaseModel):
+    total: int
+    limit: int
+    offset: int
+    items: List[ManifestInvoice]
+
+
+class RunSummary(BaseModel):
+    run_id: str
+    invoices: int
+    subtotal: float
+    gst: float
+    grand_total: float
+    created_at: float
+
+
+class RunPage(BaseModel):
+    total: int
+    limit: int
+    offset: int
+    items: List[RunSummary]
+
+
+class StageStatus(BaseModel):
+    status: str
+    duration: Optional[float] = None
+
+
+class JobStatus(BaseModel):
+    job_id: str
+    status: str
+    stages: Dict[str, StageStatus]
+    error: Optional[str] = None
+    details: dict = {}
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
 
 
 validator = FileExtensionValidator()
-webhook_sender = WebhookSender()
-csv_processor = CsvProcessor()
+workspaces = WorkspaceManager(
+    app_settings.WORKSPACE_ROOT,
+    retention=app_settings.WORKSPACE_RETENTION_HOURS * 3600,
+)
+
+
+def job_state_path(run_id):
+    # Job state lives in the run's workspace so any worker process can report it
+    workspace = workspaces.get(run_id)
+    return os.path.join(workspace.path, "job.json") if workspace else None
+
+
+job_manager = JobManager(
+    max_workers=app_settings.JOB_WORKERS,
+    max_queued=app_settings.JOB_QUEUE_LIMIT,
+    state_path=job_state_path,
+)
+artifact_executor = ThreadPoolExecutor(max_workers=1)
+fingerprint_store = FingerprintStore(app_settings.FINGERPRINT_STORE_PATH)
+invoice_manifest = InvoiceManifest(app_settings.INVOICE_MANIFEST_PATH)
+# cProfile can only follow one run at a time
+profile_lock = threading.Lock()
+
+
+@app.middleware("http")
+async def reject_oversized_uploads(request, call_next):
+    # Refuse oversized pay-run submissions from the Content-Length header,
+    # before the multipart body is read
+    if request.method == "POST" and request.url.path in ("/process_data_and_invoices", "/jobs", "/preview"):
+        content_length = request.headers.get("content-length")
+        limit = app_settings.MAX_UPLOAD_BYTES * len(upload_file_names) + 64 * 1024
+        if content_length and content_length.isdigit() and int(content_length) > limit:
+            return JSONResponse(
+                status_code=413,
+                content={"detail": f"Request body exceeds the upload limit of {limit} bytes"},
+            )
+    return await call_next(request)
 
 
 # Redirect the root path to /docs
@@ -148,109 +304,598 @@ async def redirect_to_docs():
     return RedirectResponse(url="/docs")
 
 
-@app.post("/process_data_and_invoices", response_model=ProcessInvoicesResponse, tags=["Run Script"])
-async def process_data_and_invoices(
-    pay_journal: UploadFile,
-    daily_cost_detail: UploadFile,
-    input_charge_Sheet: UploadFile,
-    job_classification: UploadFile,
-):
-    valid_extensions = ["csv", "xlsx"]
-    files = [pay_journal, daily_cost_detail, input_charge_Sheet, job_classification]
-    file_names = [
-        "Pay Journal (CSV).csv",
-        "Daily Cost Detail - Actual (CSV).csv",
-        "Charge Sheet.csv",
-        "Job_Classifications.csv",
-    ]
+# Uploads are stored under these names, with the extension of their real format
+upload_file_names = [
+    "Pay Journal (CSV)",
+    "Daily Cost Detail - Actual (CSV)",
+    "Charge Sheet",
+    "Job_Classifications",
+]
+upload_extensions = ["csv", "xlsx"]
+
+pay_run_stages = ["ingest", "process_data", "render_pdfs", "summarise", "webhook"]
+
+
+async def save_uploads(files, upload_dir, run_id=None):
+    """
+    Validate the uploaded files and stream them into upload_dir.
 
+    :param files: UploadFiles in the order of upload_file_names.
+    :param upload_dir: Folder to store the uploads in.
+    :param run_id: Identifier of the run, recorded against each file's hash;
+        previews pass None so they are not recorded.
+    :return: List of dictionaries describing the saved files.
+    """
     for file in files:
-        if not validator.is_valid_file_extension(file.filename, valid_extensions):
+        if not validator.is_valid_file_extension(file.filename, upload_extensions):
             raise HTTPException(
                 status_code=400,
                 detail="Invalid file extension. Supported extensions are .csv and .xlsx.",
             )
 
-    upload_dir = "uploads"
     os.makedirs(upload_dir, exist_ok=True)
 
+    saved = []
     for i, file in enumerate(files):
-        content = await file.read()
-        filename = file_names[i]
-        with open(os.path.join(upload_dir, filename), "wb") as f:
-            f.write(content)
-
-    combined_file_path = os.path.join(
-        upload_dir, "CYP invoice query FY 24 Auto Reconciliation.xlsm"
-    )
-    combined_wb = openpyxl.Workbook()
-
-    for source_filename in ["Job_Classifications.csv", "Charge Sheet.csv"]:
-        source_path = os.path.join(upload_dir, source_filename)
-        if not os.path.exists(source_path):
-            print(f"File '{source_filename}' does not exist at '{source_path}'")
-            continue
-        if not source_filename.endswith(".csv"):
-            print(
-                f"Error loading '{source_filename}': Unsupported format. Supported formats are: .csv"
+        extension = file.filename.split(".")[-1]
+        filename = f"{upload_file_names[i]}.{extension}"
+        try:
+            info = await save_upload(
+                file,
+                os.path.join(upload_dir, filename),
+                expected_type=extension,
+                max_bytes=app_settings.MAX_UPLOAD_BYTES,
             )
-            continue
+        except UploadTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except UploadTypeError as e:
+            raise HTTPException(status_code=415, detail=str(e))
+        if run_id is not None:
+            info["previous_run_id"] = invoice_manifest.record_upload(info["sha256"], run_id)
+        del info["path"]
+        saved.append(info)
+    return saved
+
+
+def find_upload(upload_dir, name):
+    """
+    :param upload_dir: Folder the uploads were saved in.
+    :param name: Entry of upload_file_names.
+    :return: Path of the saved upload.
+    :raises ValueError: If the upload is missing.
+    """
+    for extension in upload_extensions:
+        path = os.path.join(upload_dir, f"{name}.{extension}")
+        if os.path.exists(path):
+            return path
+    raise ValueError(f"'{name}' was not uploaded")
+
+
+def pdf_url(run_id, pdf_file):
+    return f"{app_settings.BASE_URL}/runs/{run_id}/pdfs/{pdf_file}"
+
+
+def cleanup_workspaces():
+    # Expired runs are dropped from the manifest together with their workspace;
+    # queued and running jobs keep theirs
+    invoice_manifest.remove_runs(workspaces.cleanup(keep=job_manager.unfinished_ids()))
+
+
+def report_artifact_failure(file_path, future):
+    """
+    Done-callback of background artifact writes; nobody waits for their
+    result, so a failure is only visible in the log.
+
+    :param file_path: Path of the artifact that was written.
+    :param future: Finished future of the write.
+    """
+    e = future.exception()
+    if e is not None:
+        print(f"Writing {os.path.basename(file_path)} failed: {e}")
+
+
+async def cleanup_periodically():
+    """
+    Remove expired workspaces at startup and then every cleanup interval, so
+    they also expire while no runs are submitted.
+    """
+    while True:
         try:
-            df = pd.read_csv(source_path)
-            ws = combined_wb.create_sheet(title=source_filename.replace(".csv", ""))
-            ws.append(list(df.columns))
-            for index, row in df.iterrows():
-                row_values = list(row)
-                ws.append(row_values)
+            await asyncio.to_thread(cleanup_workspaces)
         except Exception as e:
-            print(f"Error loading '{source_filename}': {str(e)}")
-            continue
-
-    combined_wb.save(combined_file_path)
-    combined_wb.close()
+            print(f"Workspace cleanup failed: {e}")
+        await asyncio.sleep(workspaces.cleanup_interval)
+
+
+def read_uploads(upload_dir, chunk_rows=0):
+    """
+    Read the Pay Journal, Job_Classifications and Charge Sheet uploads.
+
+    Each upload is read as CSV or streamed from an xlsx workbook, keeping only
+    the used columns. In streaming mode the Pay Journal is only opened here
+    and read chunk by chunk in process_data.
+
+    :param upload_dir: Folder the uploads were saved in.
+    :param chunk_rows: Rows per Pay Journal chunk, or 0 to read it at once.
+    :return: Tuple of (pay journal, job classifications, charge sheet); the
+        pay journal is an iterator of chunks when chunk_rows is set.
+    :raises ValueError: If an upload is missing or cannot be read.
+    """
+    from app.csv_reader import DataReader
+    from app.processor import DataProcessor
+
+    tables = []
+    for name, options in [
+        ("Pay Journal (CSV)", {"skip_rows": 1, "columns": DataProcessor.pay_journal_columns,
+                               "dtypes": DataProcessor.pay_journal_dtypes}),
+        ("Job_Classifications", {"columns": DataProcessor.job_classification_columns,
+                                 "sheet_name": "Job_Classifications"}),
+        ("Charge Sheet", {"columns": DataProcessor.charge_sheet_columns,
+                          "sheet_name": "Charge Sheet"}),
+    ]:
+        upload_path = find_upload(upload_dir, name)
+        if chunk_rows and not tables:
+            df = DataReader(upload_path).iter_chunks(chunk_rows, **options)
+        else:
+            df = DataReader(upload_path).read_table(**options)
+        if isinstance(df, str):
+            raise ValueError(f"Error loading '{os.path.basename(upload_path)}': {df}")
+        tables.append(df)
+    return tuple(tables)
+
+
+def run_pay_run(workspace, incremental=False, profile=False, progress=None):
+    """
+    Run the full pay run on stored uploads and collect its metrics.
+
+    :param workspace: RunWorkspace whose upload folder holds the files saved by save_uploads.
+    :param incremental: Skip cost centres whose inputs match their last delivered run.
+    :param profile: Record the run with cProfile and save the stats as
+        profile.pstats in the workspace. Only the job thread is profiled;
+        PDF render threads are not.
+    :param progress: Optional callable taking (stage, status) for progress reporting.
+    :return: Dictionary matching ProcessInvoicesResponse.
+    :raises ValueError: If an uploaded table cannot be read.
+    """
+    run_metrics = RunMetrics()
+    profiler = None
+    if profile:
+        profile_lock.acquire()
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        response = execute_pay_run(workspace, incremental, run_metrics, progress)
+    except Exception:
+        run_metrics.finish("failed")
+        raise
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(os.path.join(workspace.path, "profile.pstats"))
+            profile_lock.release()
+    run_metrics.finish("succeeded")
+
+    response["metrics"] = run_metrics.to_dict()
+    if profiler is not None:
+        response["profile_url"] = f"{app_settings.BASE_URL}/runs/{workspace.run_id}/profile"
+    return response
+
+
+def execute_pay_run(workspace, incremental, run_metrics, progress=None):
+    """
+    Run the stages of a pay run: build invoices, render PDFs and deliver
+    them to the webhook.
+
+    Once every webhook batch is delivered, the input fingerprints of the
+    rebuilt cost centres are recorded. An incremental run only rebuilds and
+    delivers cost centres whose fingerprint changed or which are new.
+
+    :param workspace: RunWorkspace whose upload folder holds the files saved by save_uploads.
+    :param incremental: Skip cost centres whose inputs match their last delivered run.
+    :param run_metrics: RunMetrics receiving stage timings and counts.
+    :param progress: Optional callable taking (stage, status) for progress reporting.
+    :return: Dictionary matching ProcessInvoicesResponse, without metrics.
+    :raises ValueError: If an uploaded table cannot be read.
+    """
+    from app.generate_pdf import InvoiceProcessor
+    from app.processor import DataProcessor
+    from app.reference_data import reference_data
+
+    upload_dir = workspace.upload_folder
+    chunk_rows = app_settings.PAY_JOURNAL_CHUNK_ROWS
+    with track_stage(progress, "ingest"), run_metrics.stage("ingest"):
+        pay_journal_df, job_classifications_df, charge_sheet_df = read_uploads(upload_dir, chunk_rows)
+        run_metrics.add_rows(
+            "ingest",
+            job_classifications=len(job_classifications_df),
+            charge_sheet=len(charge_sheet_df),
+        )
 
-    file_paths = [
-        "./uploads/Pay Journal (CSV).csv",
-        f"./{combined_file_path}",
-    ]
-    data_processor = DataProcessor(file_paths)
-    data_processor.process_data()
-
-    csv_folder_path = "./invoice_folder"
-    pdf_folder_path = "./final_folder"
-    invoice_folder = "invoice_folder"
-    output_folder = "final_folder"
-    os.makedirs(output_folder, exist_ok=True)
-    invoice_processor = InvoiceProcessor(invoice_folder, output_folder)
-    invoice_processor.process_invoices()
-    pdf_folder = "final_folder"
-    pdf_urls = []
-    for pdf_filename in os.listdir(output_folder):
-        pdf_path = f"{app_settings.BASE_URL}/{pdf_folder}/{pdf_filename}"
-        pdf_urls.append(pdf_path)
-
-    result, files_list = csv_processor.calculate_amount_sum(
-        csv_folder_path, pdf_folder_path
-    )
+    if app_settings.EXPORT_RECONCILIATION_WORKBOOK:
+        # The workbook is only an artifact for manual reconciliation, so write it off the critical path
+        combined_file_path = os.path.join(
+            upload_dir, "CYP invoice query FY 24 Auto Reconciliation.xlsm"
+        )
+        export = artifact_executor.submit(
+            DataProcessor.export_workbook,
+            {"Job_Classifications": job_classifications_df, "Charge Sheet": charge_sheet_df},
+            combined_file_path,
+        )
+        export.add_done_callback(functools.partial(report_artifact_failure, combined_file_path))
+
+    with track_stage(progress, "process_data"), run_metrics.stage("process_data"):
+        create_processor = DataProcessor.from_chunks if chunk_rows else DataProcessor.from_frames
+        data_processor = create_processor(
+            pay_journal_df,
+            job_classifications_df,
+            charge_sheet_df,
+            debug_output=app_settings.WRITE_COST_CENTRE_CSV,
+            export_csv=app_settings.EXPORT_INVOICE_CSV,
+            output_folder=workspace.output_folder,
+            invoice_folder=workspace.invoice_folder,
+            previous_fingerprints=fingerprint_store.load() if incremental else None,
+            fingerprint_salt=reference_data.digests(),
+            spill_folder=os.path.join(workspace.path, "spill"),
+        )
+        data_processor.process_data()
+        run_metrics.add_rows("process_data", **data_processor.row_counts)
+
+    with track_stage(progress, "render_pdfs"), run_metrics.stage("render_pdfs"):
+        invoice_processor = InvoiceProcessor(
+            workspace.invoice_folder,
+            workspace.final_folder,
+            max_workers=app_settings.PDF_RENDER_WORKERS,
+            render_timeout=app_settings.PDF_RENDER_TIMEOUT,
+            pdf_cache=get_pdf_cache(),
+        )
+        render_results = invoice_processor.process_invoices()
+        run_metrics.add_render_results(render_results)
+    with track_stage(progress, "summarise"), run_metrics.stage("summarise"):
+        # Summaries were built while each invoice was generated; no files are read here
+        summaries = invoice_processor.summaries(render_results)
+        result = [summary.to_record() for summary in summaries]
+        # PDFs are streamed from disk by the webhook sender, not loaded here
+        files_list = [summary.pdf_file() for summary in summaries]
+        # Only this run's invoices are listed, from the manifest rather than the folder
+        recorded = invoice_manifest.record(
+            workspace.run_id, [summary.manifest_entry() for summary in summaries]
+        )
+        pdf_urls = [pdf_url(row["run_id"], row["pdf_file"]) for row in recorded]
+        run_metrics.add_rows("summarise", invoices=len(result))
     data = {"data": result}
     files = {"files": files_list}
 
-    webhook_response = webhook_sender.send_data_to_webhook(data, files)
+    with track_stage(progress, "webhook"), run_metrics.stage("webhook"):
+        if incremental and not result:
+            webhook_response = {"message": "No changed invoices to send", "batches": []}
+        else:
+            webhook_response = get_webhook_sender().send_data_to_webhook(data, files, workspace.run_id)
+        run_metrics.add_webhook_batches(webhook_response["batches"])
+
+    if all(batch["success"] for batch in webhook_response["batches"]):
+        rendered = {
+            result.invoice_file for result in render_results if result.success
+        }
+        fingerprint_store.update(
+            {
+                cost_centre: data_processor.fingerprints[cost_centre]
+                for cost_centre, invoice_file in data_processor.invoice_files.items()
+                if invoice_file in rendered
+            },
+            workspace.run_id,
+        )
 
     return {
         "message": "Data processing and invoice processing complete",
         "webhook_response": webhook_response,
         "pdf_urls": pdf_urls,
+        "render_results": [result.to_dict() for result in render_results],
+        "pdf_cache": {
+            "hits": sum(result.cached for result in render_results),
+            "misses": sum(result.success and not result.cached for result in render_results),
+        },
+        "cost_centres": {
+            "rebuilt": data_processor.rebuilt,
+            "skipped": data_processor.skipped,
+        },
+    }
+
+
+def preview_pay_run(workspace, html_cost_centres=()):
+    """
+    Build the invoice lines of a pay run and summarise every invoice,
+    without rendering PDFs or calling the webhook.
+
+    Fingerprints are neither read nor recorded, so a preview never affects
+    incremental runs.
+
+    :param workspace: RunWorkspace whose upload folder holds the files saved by save_uploads.
+    :param html_cost_centres: Cost centres whose invoice HTML is included.
+    :return: Dictionary matching PreviewResponse.
+    :raises ValueError: If an upload cannot be read or a requested cost centre does not exist.
+    """
+    from app.generate_pdf import InvoiceProcessor
+    from app.processor import DataProcessor
+
+    run_metrics = RunMetrics()
+    chunk_rows = app_settings.PAY_JOURNAL_CHUNK_ROWS
+    with run_metrics.stage("preview_ingest"):
+        pay_journal_df, job_classifications_df, charge_sheet_df = read_uploads(
+            workspace.upload_folder, chunk_rows
+        )
+
+    with run_metrics.stage("preview_process_data"):
+        create_processor = DataProcessor.from_chunks if chunk_rows else DataProcessor.from_frames
+        data_processor = create_processor(
+            pay_journal_df,
+            job_classifications_df,
+            charge_sheet_df,
+            output_folder=workspace.output_folder,
+            invoice_folder=workspace.invoice_folder,
+            spill_folder=os.path.join(workspace.path, "spill"),
+        )
+        # Invoice lines are kept in memory, except in streaming mode where they are read back
+        invoices = data_processor.process_data()
+        run_metrics.add_rows("preview_process_data", **data_processor.row_counts)
+
+    unknown = sorted(set(html_cost_centres) - set(data_processor.invoice_files))
+    if unknown:
+        raise ValueError(f"Unknown cost centres: {', '.join(unknown)}")
+
+    with run_metrics.stage("preview_summarise"):
+        invoice_processor = InvoiceProcessor(workspace.invoice_folder, workspace.final_folder)
+        previews = [
+            invoice_processor.preview(
+                invoice_file,
+                invoices.get(invoice_file),
+                include_html=cost_centre in html_cost_centres,
+            )
+            for cost_centre, invoice_file in data_processor.invoice_files.items()
+        ]
+
+    return {
+        "message": "Preview complete",
+        "invoices": previews,
+        "metrics": run_metrics.to_dict(),
+    }
+
+
+async def submit_pay_run(files, incremental=False, profile=False):
+    """
+    Store the uploads of a pay run and queue it on the job manager.
+
+    :param files: UploadFiles in the order of upload_file_names.
+    :param incremental: Only rebuild cost centres whose inputs changed.
+    :param profile: Record the run with cProfile.
+    :return: The queued Job.
+    """
+    cleanup_workspaces()
+    workspace = workspaces.new()
+    try:
+        uploads = await save_uploads(files, workspace.upload_folder, workspace.run_id)
+        return job_manager.submit(
+            run_pay_run,
+            workspace,
+            incremental=incremental,
+            profile=profile,
+            stages=pay_run_stages,
+            job_id=workspace.run_id,
+            details={"uploads": uploads, "incremental": incremental},
+        )
+    except QueueFullError as e:
+        shutil.rmtree(workspace.path, ignore_errors=True)
+        invoice_manifest.remove_runs([workspace.run_id])
+        raise HTTPException(status_code=429, detail=str(e))
+    except HTTPException:
+        shutil.rmtree(workspace.path, ignore_errors=True)
+        invoice_manifest.remove_runs([workspace.run_id])
+        raise
+
+
+@app.post("/process_data_and_invoices", response_model=ProcessInvoicesResponse, tags=["Run Script"])
+async def process_data_and_invoices(
+    pay_journal: UploadFile,
+    daily_cost_detail: UploadFile,
+    input_charge_Sheet: UploadFile,
+    job_classification: UploadFile,
+    incremental: Optional[bool] = None,
+    profile: bool = False,
+):
+    if incremental is None:
+        incremental = app_settings.INCREMENTAL_RUNS
+    job = await submit_pay_run(
+        [pay_journal, daily_cost_detail, input_charge_Sheet, job_classification],
+        incremental=incremental,
+        profile=profile,
+    )
+    try:
+        return await asyncio.wrap_future(job.future)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/preview", response_model=PreviewResponse, tags=["Run Script"])
+async def preview_invoices(
+    pay_journal: UploadFile,
+    daily_cost_detail: UploadFile,
+    input_charge_Sheet: UploadFile,
+    job_classification: UploadFile,
+    html: List[str] = Query([], description="Cost centres to include the rendered invoice HTML for"),
+):
+    # Previews are interactive, so they run straight away instead of queueing behind pay runs
+    cleanup_workspaces()
+    workspace = workspaces.new()
+    try:
+        await save_uploads(
+            [pay_journal, daily_cost_detail, input_charge_Sheet, job_classification],
+            workspace.upload_folder,
+        )
+        return await asyncio.to_thread(preview_pay_run, workspace, set(html))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        shutil.rmtree(workspace.path, ignore_errors=True)
+
+
+@app.post("/jobs", response_model=JobStatus, status_code=202, tags=["Jobs"])
+async def submit_job(
+    pay_journal: UploadFile,
+    daily_cost_detail: UploadFile,
+    input_charge_Sheet: UploadFile,
+    job_classification: UploadFile,
+    incremental: Optional[bool] = None,
+    profile: bool = False,
+):
+    if incremental is None:
+        incremental = app_settings.INCREMENTAL_RUNS
+    job = await submit_pay_run(
+        [pay_journal, daily_cost_detail, input_charge_Sheet, job_classification],
+        incremental=incremental,
+        profile=profile,
+    )
+    return job.to_dict()
+
+
+@app.get("/jobs/{job_id}", response_model=JobStatus, tags=["Jobs"])
+def job_status(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+@app.get("/jobs/{job_id}/result", response_model=ProcessInvoicesResponse, tags=["Jobs"])
+def job_result(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=job.error)
+    if job.status != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    return job.result
+
+
+def manifest_invoice(row):
+    from app.money import cents_to_dollars
+
+    return {
+        "run_id": row["run_id"],
+        "cost_centre": row["cost_centre"],
+        "invoice_file": row["invoice_file"],
+        "pdf_url": pdf_url(row["run_id"], row["pdf_file"]),
+        "pdf_bytes": row["pdf_bytes"],
+        "sha256": row["sha256"],
+        "subtotal": cents_to_dollars(row["subtotal_cents"]),
+        "gst": cents_to_dollars(row["gst_cents"]),
+        "grand_total": cents_to_dollars(row["grand_total_cents"]),
+        "created_at": row["created_at"],
     }
 
 
-@app.get("/{pdf_folder}/{pdf_filename}", include_in_schema=False)
-def serve_pdf(pdf_filename: str):
-    pdf_path = os.path.join(app_settings.DIRECTORY_PATH, pdf_filename)
-    if os.path.exists(pdf_path):
-        return FileResponse(pdf_path)
-    else:
-        return {"detail": "PDF not found"}, 404
+@app.get("/runs", response_model=RunPage, tags=["Invoices"])
+def list_runs(limit: int = Query(50, ge=1, le=500), offset: int = Query(0, ge=0)):
+    from app.money import cents_to_dollars
+
+    total, rows = invoice_manifest.list_runs(limit=limit, offset=offset)
+    items = [
+        {
+            "run_id": row["run_id"],
+            "invoices": row["invoices"],
+            "subtotal": cents_to_dollars(row["subtotal_cents"]),
+            "gst": cents_to_dollars(row["gst_cents"]),
+            "grand_total": cents_to_dollars(row["grand_total_cents"]),
+            "created_at": row["created_at"],
+        }
+        for row in rows
+    ]
+    return {"total": total, "limit": limit, "offset": offset, "items": items}
+
+
+@app.get("/runs/{run_id}/invoices", response_model=InvoicePage, tags=["Invoices"])
+def list_run_invoices(run_id: str, limit: int = Query(50, ge=1, le=500), offset: int = Query(0, ge=0)):
+    total, rows = invoice_manifest.list_invoices(run_id=run_id, limit=limit, offset=offset)
+    if not total and workspaces.get(run_id) is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    return {"total": total, "limit": limit, "offset": offset, "items": [manifest_invoice(row) for row in rows]}
+
+
+@app.get("/invoices", response_model=InvoicePage, tags=["Invoices"])
+def list_invoices(
+    cost_centre: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+):
+    total, rows = invoice_manifest.list_invoices(cost_centre=cost_centre, limit=limit, offset=offset)
+    return {"total": total, "limit": limit, "offset": offset, "items": [manifest_invoice(row) for row in rows]}
+
+
+def etag_matches(if_none_match, etag):
+    """
+    :param if_none_match: Value of the If-None-Match request header.
+    :param etag: Quoted ETag of the current representation.
+    :return: True if the client's cached copy is current.
+    """
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    # If-None-Match uses weak comparison, so W/ prefixes are ignored
+    return etag in [candidate[2:] if candidate.startswith("W/") else candidate for candidate in candidates]
+
+
+@app.get("/runs/{run_id}/pdfs/{pdf_filename}", include_in_schema=False)
+def serve_run_pdf(run_id: str, pdf_filename: str, request: Request):
+    workspace = workspaces.get(run_id)
+    if workspace is None or os.path.basename(pdf_filename) != pdf_filename:
+        raise HTTPException(status_code=404, detail="PDF not found")
+    pdf_path = os.path.join(workspace.final_folder, pdf_filename)
+    if not os.path.isfile(pdf_path):
+        raise HTTPException(status_code=404, detail="PDF not found")
+
+    headers = {"Cache-Control": app_settings.PDF_CACHE_CONTROL}
+    entry = invoice_manifest.get(run_id, pdf_filename)
+    if entry is not None:
+        # A run's PDFs never change, so their content hash is a strong ETag
+        headers["ETag"] = f'"{entry["sha256"]}"'
+        if etag_matches(request.headers.get("if-none-match", ""), headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+    # FileResponse answers Range requests (206) and checks If-Range against the ETag
+    return FileResponse(pdf_path, media_type="application/pdf", headers=headers)
+
+
+@app.get("/runs/{run_id}/profile", include_in_schema=False)
+def serve_run_profile(run_id: str):
+    workspace = workspaces.get(run_id)
+    profile_path = os.path.join(workspace.path, "profile.pstats") if workspace else None
+    if profile_path is None or not os.path.isfile(profile_path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(
+        profile_path, media_type="application/octet-stream", filename=f"{run_id}.pstats"
+    )
+
+
+@app.get("/metrics", response_class=PlainTextResponse, tags=["Diagnostics"])
+def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/reference_data", tags=["Diagnostics"])
+def reference_data_stats():
+    from app.reference_data import reference_data
+
+    return reference_data.stats()
+
+
+@app.get("/health", tags=["Diagnostics"])
+def health():
+    return {"status": "ok"}
+
+
+@app.get("/ready", tags=["Diagnostics"])
+def ready():
+    # Reports 503 until the reference data, template and heavy modules are loaded
+    status = {"ready": warm_up_done.is_set(), "pid": os.getpid(), "warm_up": warm_up_state}
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
 
 
 def custom_openapi():
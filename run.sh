@@ -1,3 +1,4 @@
 #!/bin/bash
 
-nohup uvicorn main:app --reload --host 0.0.0.0 --port 8000 &
+# Warms up once, then forks WEB_CONCURRENCY workers (default: the CPU count) on port 8000
+nohup python serve.py --host 0.0.0.0 --port 8000 &
@@ -0,0 +1,163 @@
+"""
+Production launcher: warm the app up once, then prefork uvicorn workers.
+
+    python serve.py --host 0.0.0.0 --port 8000 --workers 4
+
+The parent process imports main, loads the reference data, the compiled
+invoice template and the heavy modules (main.warm_up), binds the listening
+socket and then forks the workers. The workers share the loaded state
+copy-on-write and accept connections from the shared socket, so a worker
+that is restarted is serving again immediately. The parent only supervises:
+it restarts workers that exit and stops them all on SIGTERM or SIGINT.
+
+Workers save their metrics to METRICS_DIRECTORY (state/metrics by default),
+so GET /metrics on any worker reports the totals of all of them.
+"""
+import argparse
+import os
+import signal
+import socket
+import sys
+import time
+
+
+repo_root = os.path.dirname(os.path.abspath(__file__))
+
+
+def bind_socket(host, port, backlog=2048):
+    """
+    :return: Listening TCP socket, inheritable by forked workers.
+    """
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+class Supervisor:
+    def __init__(self, sock, workers, log_level="info", timeout_keep_alive=5, restart_delay=1.0,
+                 metrics=None):
+        """
+        Fork uvicorn workers on a shared socket and keep them running.
+
+        :param sock: Listening socket returned by bind_socket.
+        :param workers: Number of worker processes.
+        :param log_level: uvicorn log level of the workers.
+        :param timeout_keep_alive: Seconds an idle keep-alive connection is kept open.
+        :param restart_delay: Seconds to wait before restarting a worker that
+            exited within restart_delay * 5 seconds of starting, so a crashing
+            worker is not restarted in a tight loop.
+        :param metrics: Optional MetricsRegistry shared by the workers through
+            its directory; the metrics of exited workers are kept in their totals.
+        """
+        self.sock = sock
+        self.workers = workers
+        self.log_level = log_level
+        self.timeout_keep_alive = timeout_keep_alive
+        self.restart_delay = restart_delay
+        self.metrics = metrics
+        self.children = {}
+        self.stopping = False
+
+    def run_worker(self):
+        import uvicorn
+        import main
+
+        config = uvicorn.Config(
+            main.app,
+            log_level=self.log_level,
+            timeout_keep_alive=self.timeout_keep_alive,
+        )
+        uvicorn.Server(config).run(sockets=[self.sock])
+
+    def spawn(self):
+        pid = os.fork()
+        if pid:
+            self.children[pid] = time.monotonic()
+            return pid
+        # Worker: uvicorn installs its own SIGTERM/SIGINT handlers for a graceful shutdown
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        status = 0
+        try:
+            self.run_worker()
+        except BaseException as e:
+            print(f"Worker {os.getpid()} failed: {e}", file=sys.stderr)
+            status = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(status)
+
+    def stop(self, signum, frame):
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        """
+        Start the workers and supervise them until SIGTERM or SIGINT.
+        """
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for _ in range(self.workers):
+            self.spawn()
+        print(f"Started {self.workers} workers: {', '.join(map(str, self.children))}")
+
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            started_at = self.children.pop(pid, None)
+            if started_at is None:
+                continue
+            if self.metrics is not None:
+                self.metrics.mark_process_dead(pid)
+            if self.stopping:
+                continue
+            print(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}; restarting")
+            if time.monotonic() - started_at < self.restart_delay * 5:
+                time.sleep(self.restart_delay)
+            if not self.stopping:
+                self.spawn()
+        self.sock.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.environ.get("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", "0")) or os.cpu_count(),
+                        help="Number of worker processes (default: WEB_CONCURRENCY or the CPU count)")
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--timeout-keep-alive", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    # Templates, reference data and run folders are resolved relative to the repository
+    os.chdir(repo_root)
+    sys.path.insert(0, repo_root)
+    os.environ.setdefault("METRICS_DIRECTORY", os.path.join("state", "metrics"))
+    import main as app_module
+    from app.metrics import registry
+
+    # Counters start from zero with every server start, as they would in a single process
+    registry.clear_directory()
+
+    start = time.perf_counter()
+    app_module.warm_up()
+    print(f"Warm-up finished in {time.perf_counter() - start:.2f}s")
+
+    sock = bind_socket(args.host, args.port)
+    print(f"Listening on {args.host}:{args.port}")
+    Supervisor(sock, args.workers, args.log_level, args.timeout_keep_alive, metrics=registry).run()
+
+
+if __name__ == "__main__":
+    main()
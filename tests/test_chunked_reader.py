@@ -0,0 +1,98 @@
+import os
+
+import pandas as pd
+import pytest
+
+from app.csv_reader import DataReader
+from app.processor import DataProcessor
+from app.synthetic import SyntheticPayRun
+
+
+@pytest.fixture(scope="module")
+def pay_run(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("pay_run")
+    generated = SyntheticPayRun(employees=60, cost_centres=5, pay_items=8, seed=3).write(str(directory))
+
+    # Give one cost centre whole, non-blank hours in the first pay item, so
+    # chunks holding only its rows would be inferred as int64
+    pay_journal_path = generated["uploads"][0]
+    journal_df = pd.read_csv(pay_journal_path, skiprows=1)
+    first_item = next(iter(DataProcessor.pay_item_mapping))
+    rows = journal_df["Cost Centre"] == "SYN-C001"
+    journal_df.loc[rows, first_item] = journal_df.loc[rows, first_item].fillna(0).round() + 1
+    with open(pay_journal_path, "w", newline="") as f:
+        f.write("Pay Journal Report\n")
+        journal_df.to_csv(f, index=False, float_format="%g")
+    return generated
+
+
+def read_tables(pay_run):
+    pay_journal_path, _, charge_sheet_path, job_classifications_path = pay_run["uploads"]
+    return (
+        DataReader(pay_journal_path).read_table(
+            skip_rows=1, columns=DataProcessor.pay_journal_columns, dtypes=DataProcessor.pay_journal_dtypes
+        ),
+        DataReader(job_classifications_path).read_table(columns=DataProcessor.job_classification_columns),
+        DataReader(charge_sheet_path).read_table(columns=DataProcessor.charge_sheet_columns),
+    )
+
+
+def invoice_outputs(processor):
+    processor.process_data()
+    outputs = {}
+    for file_name in sorted(os.listdir(processor.invoice_folder)):
+        with open(os.path.join(processor.invoice_folder, file_name), "rb") as f:
+            outputs[file_name] = f.read()
+    return processor.fingerprints, outputs
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 25, 10000])
+def test_chunked_output_matches_in_memory(pay_run, tmp_path, chunk_size):
+    frames = read_tables(pay_run)
+    expected = invoice_outputs(
+        DataProcessor.from_frames(*frames, invoice_folder=str(tmp_path / "in_memory"), export_csv=True)
+    )
+
+    chunks = DataReader(pay_run["uploads"][0]).iter_chunks(
+        chunk_size, skip_rows=1, columns=DataProcessor.pay_journal_columns,
+        dtypes=DataProcessor.pay_journal_dtypes,
+    )
+    actual = invoice_outputs(
+        DataProcessor.from_chunks(chunks, *frames[1:], invoice_folder=str(tmp_path / "chunked"), export_csv=True)
+    )
+
+    assert expected[1]
+    assert actual[0] == expected[0]
+    assert actual[1].keys() == expected[1].keys()
+    for file_name, content in expected[1].items():
+        assert actual[1][file_name] == content, file_name
+
+
+def test_pay_items_are_read_as_float(pay_run):
+    for chunk in DataReader(pay_run["uploads"][0]).iter_chunks(
+        1, skip_rows=1, columns=DataProcessor.pay_journal_columns, dtypes=DataProcessor.pay_journal_dtypes
+    ):
+        for column in DataProcessor.pay_item_mapping:
+            if column in chunk:
+                assert chunk[column].dtype == "float64"
+
+
+def test_corrupt_workbook_raises_value_error(tmp_path):
+    path = tmp_path / "Pay Journal (CSV).xlsx"
+    path.write_bytes(b"PK\x03\x04garbage")
+    assert DataReader(str(path)).read_table(skip_rows=1).startswith("Error reading XLSX")
+
+    chunks = DataReader(str(path)).iter_chunks(10, skip_rows=1)
+    with pytest.raises(ValueError, match="Error reading table"):
+        next(chunks)
+
+
+def test_bad_value_in_later_chunk_raises_value_error(tmp_path):
+    path = tmp_path / "Pay Journal (CSV).csv"
+    rows = [f"{number},SYN-C001,{number % 8}" for number in range(10)] + ["10,SYN-C001,eight"]
+    path.write_text("Pay Journal Report\nEmployee No.,Cost Centre,Normal Hourly (Qty)\n" + "\n".join(rows) + "\n")
+
+    chunks = DataReader(str(path)).iter_chunks(4, skip_rows=1, dtypes=DataProcessor.pay_journal_dtypes)
+    assert len(next(chunks)) == 4
+    with pytest.raises(ValueError, match="Error reading table"):
+        list(chunks)
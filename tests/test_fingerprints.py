@@ -0,0 +1,33 @@
+import multiprocessing
+
+from app.fingerprints import FingerprintStore
+
+
+def record_cost_centres(file_path, worker, count):
+    store = FingerprintStore(file_path)
+    for number in range(count):
+        store.update({f"W{worker}-C{number:03d}": f"fingerprint-{worker}-{number}"}, f"run-{worker}")
+
+
+def test_concurrent_processes_keep_every_update(tmp_path):
+    file_path = str(tmp_path / "state" / "cost_centre_fingerprints.json")
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=record_cost_centres, args=(file_path, worker, 50)) for worker in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+
+    fingerprints = FingerprintStore(file_path).load()
+    assert len(fingerprints) == 200
+    assert fingerprints["W3-C049"] == "fingerprint-3-49"
+
+
+def test_update_replaces_existing_fingerprints(tmp_path):
+    store = FingerprintStore(str(tmp_path / "fingerprints.json"))
+    assert store.load() == {}
+    store.update({"A": "1", "B": "2"}, "run1")
+    store.update({"B": "3"}, "run2")
+    store.update({}, "run3")
+    assert store.load() == {"A": "1", "B": "3"}
@@ -0,0 +1,162 @@
+import hashlib
+import os
+
+import pytest
+
+from app.synthetic import SyntheticPayRun
+
+
+repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+upload_fields = ["pay_journal", "daily_cost_detail", "input_charge_Sheet", "job_classification"]
+
+
+class DeliveredSender:
+    # Stands in for WebhookSender; every batch is delivered
+    def send_data_to_webhook(self, data, files, run_id=None):
+        return {"message": "Data sent to the webhook successfully", "batches": []}
+
+
+def mock_html_to_pdf(html, pdf_output, timeout=None, options=None):
+    with open(pdf_output, "wb") as f:
+        f.write(b"%PDF-1.4\n" + html.encode("utf-8"))
+
+
+@pytest.fixture(scope="module")
+def app_client(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("app")
+    generated = SyntheticPayRun(employees=80, cost_centres=4, pay_items=6, seed=5).write(str(directory))
+    os.symlink(os.path.join(repo_root, "templates"), directory / "templates")
+
+    previous_cwd = os.getcwd()
+    os.chdir(directory)
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        from fastapi.testclient import TestClient
+        import app.generate_pdf
+        import main
+
+        monkeypatch.setattr(app.generate_pdf, "html_to_pdf", mock_html_to_pdf)
+        monkeypatch.setattr(main, "get_webhook_sender", DeliveredSender)
+        try:
+            with TestClient(main.app) as client:
+                run_ids = []
+                for _ in range(2):
+                    files = {
+                        field: (os.path.basename(path), open(path, "rb"), "text/csv")
+                        for field, path in zip(upload_fields, generated["uploads"])
+                    }
+                    response = client.post("/process_data_and_invoices", files=files)
+                    assert response.status_code == 200, response.text
+                    run_ids.append(response.json()["pdf_urls"][0].split("/")[-3])
+                yield client, run_ids
+        finally:
+            os.chdir(previous_cwd)
+
+
+@pytest.fixture(scope="module")
+def pdf(app_client):
+    client, run_ids = app_client
+    invoice = client.get(f"/runs/{run_ids[0]}/invoices").json()["items"][0]
+    url = f"/runs/{run_ids[0]}/pdfs/{os.path.basename(invoice['pdf_url'])}"
+    response = client.get(url)
+    assert response.status_code == 200
+    return url, response
+
+
+def test_runs_are_listed_newest_first_and_paged(app_client):
+    client, run_ids = app_client
+    page = client.get("/runs").json()
+    assert page["total"] == 2
+    assert [item["run_id"] for item in page["items"]] == run_ids[::-1]
+    assert page["items"][0]["invoices"] == 4
+
+    page = client.get("/runs", params={"limit": 1, "offset": 1}).json()
+    assert (page["total"], page["limit"], page["offset"]) == (2, 1, 1)
+    assert [item["run_id"] for item in page["items"]] == [run_ids[0]]
+    assert client.get("/runs", params={"offset": 2}).json()["items"] == []
+    assert client.get("/runs", params={"limit": 0}).status_code == 422
+    assert client.get("/runs", params={"offset": -1}).status_code == 422
+
+
+def test_run_invoices_are_paged(app_client):
+    client, run_ids = app_client
+    everything = client.get(f"/runs/{run_ids[1]}/invoices").json()
+    assert everything["total"] == 4
+    pdf_urls = [item["pdf_url"] for item in everything["items"]]
+    assert pdf_urls == sorted(pdf_urls)
+    assert all(item["run_id"] == run_ids[1] for item in everything["items"])
+
+    page = client.get(f"/runs/{run_ids[1]}/invoices", params={"limit": 2, "offset": 1}).json()
+    assert page["total"] == 4
+    assert [item["pdf_url"] for item in page["items"]] == pdf_urls[1:3]
+    assert client.get("/runs/unknown/invoices").status_code == 404
+
+
+def test_invoices_filtered_by_cost_centre(app_client):
+    client, run_ids = app_client
+    page = client.get("/invoices", params={"cost_centre": "SYN-C002"}).json()
+    assert page["total"] == 2
+    assert [item["run_id"] for item in page["items"]] == run_ids[::-1]
+    assert {item["cost_centre"] for item in page["items"]} == {"SYN-C002"}
+    assert client.get("/invoices").json()["total"] == 8
+    assert client.get("/invoices", params={"cost_centre": "nope"}).json() == {
+        "total": 0, "limit": 50, "offset": 0, "items": [],
+    }
+
+
+def test_pdf_etag_is_the_content_hash(pdf):
+    _, response = pdf
+    assert response.headers["content-type"] == "application/pdf"
+    assert response.headers["etag"] == f'"{hashlib.sha256(response.content).hexdigest()}"'
+    assert response.headers["cache-control"] == "private, max-age=3600"
+
+
+@pytest.mark.parametrize("if_none_match", ["{etag}", 'W/"other", {etag}', "W/{etag}", "*"])
+def test_if_none_match_returns_not_modified(app_client, pdf, if_none_match):
+    client, _ = app_client
+    url, full = pdf
+    etag = full.headers["etag"]
+    response = client.get(url, headers={"If-None-Match": if_none_match.format(etag=etag)})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+
+def test_stale_if_none_match_returns_the_pdf(app_client, pdf):
+    client, _ = app_client
+    url, full = pdf
+    response = client.get(url, headers={"If-None-Match": '"other"'})
+    assert response.status_code == 200
+    assert response.content == full.content
+
+
+def test_range_returns_partial_content(app_client, pdf):
+    client, _ = app_client
+    url, full = pdf
+    length = len(full.content)
+    response = client.get(url, headers={"Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 100-199/{length}"
+    assert response.content == full.content[100:200]
+
+    response = client.get(url, headers={"Range": "bytes=-50"})
+    assert response.status_code == 206
+    assert response.content == full.content[-50:]
+
+
+def test_if_range_only_resumes_the_same_pdf(app_client, pdf):
+    client, _ = app_client
+    url, full = pdf
+    response = client.get(url, headers={"Range": "bytes=100-199", "If-Range": full.headers["etag"]})
+    assert response.status_code == 206
+    assert response.content == full.content[100:200]
+
+    response = client.get(url, headers={"Range": "bytes=100-199", "If-Range": '"stale"'})
+    assert response.status_code == 200
+    assert response.content == full.content
+
+
+def test_unknown_pdfs_are_not_found(app_client, pdf):
+    client, run_ids = app_client
+    url, _ = pdf
+    assert client.get(url.replace("/pdfs/", "/pdfs/missing-")).status_code == 404
+    assert client.get(url.replace(run_ids[0], "unknown")).status_code == 404
@@ -0,0 +1,79 @@
+import pandas as pd
+import pytest
+
+from app.matcher import OrganizationMatchError, OrganizationMatcher
+
+
+def partial_match(row, organizations_df):
+    # Row-wise matcher OrganizationMatcher replaced, kept as the reference behaviour
+    cleaned_payroll_name = row["Payroll Name"].replace(" ", "").lower()
+    cleaned_contract_entity = organizations_df["Contract Entity"].str.replace(" ", "").str.lower()
+    matching_rows = organizations_df[cleaned_contract_entity.str.contains(cleaned_payroll_name, case=False, regex=False)]
+    return matching_rows.iloc[0]
+
+
+@pytest.fixture
+def organizations_df():
+    return pd.DataFrame({
+        "Uuid": [f"uuid-{number}" for number in range(7)],
+        "Contract Entity": [
+            "Austunnel Pty Ltd Trust",
+            "Austunnel (Vic) Pty Ltd",
+            "Austunnel Pty Ltd",
+            "AUSTUNNEL (NSW) PTY LTD",
+            "Austunnel (NSW) Pty Ltd",
+            "Austunnel Pty Ltd",
+            "Tunnel Services Pty Ltd",
+        ],
+    })
+
+
+payroll_names = [
+    # Exact entity, but an earlier entity contains it: the earlier one wins
+    "Austunnel Pty Ltd ",
+    "Austunnel (Vic) Pty Ltd ",
+    # Exact entity repeated with other case/spacing: the first one wins
+    "Austunnel (NSW) Pty Ltd",
+    "austunnel(nsw)ptyltd",
+    # Substring of several entities
+    "Austunnel",
+    "Tunnel",
+    "Pty Ltd",
+    "Services",
+]
+
+
+@pytest.mark.parametrize("payroll_name", payroll_names)
+def test_match_agrees_with_partial_match(organizations_df, payroll_name):
+    expected = partial_match({"Payroll Name": payroll_name}, organizations_df)
+    pd.testing.assert_series_equal(OrganizationMatcher(organizations_df).match(payroll_name), expected)
+
+
+def test_match_many_agrees_with_partial_match(organizations_df):
+    names = pd.Series(payroll_names * 3, index=range(100, 100 + len(payroll_names) * 3))
+    expected = pd.DataFrame(
+        [partial_match({"Payroll Name": name}, organizations_df) for name in names]
+    ).set_index(names.index)
+    matcher = OrganizationMatcher(organizations_df)
+    pd.testing.assert_frame_equal(matcher.match_many(names), expected)
+    # Served from the index the second time
+    pd.testing.assert_frame_equal(matcher.match_many(names), expected)
+    pd.testing.assert_series_equal(matcher.first_match(names), expected.iloc[0])
+
+
+def test_unmatched_names_are_all_reported(organizations_df):
+    matcher = OrganizationMatcher(organizations_df)
+    names = pd.Series(["Austunnel Pty Ltd", "Acme Pty Ltd", "Austunnel", "Nobody", "Acme Pty Ltd"])
+    with pytest.raises(OrganizationMatchError) as error:
+        matcher.match_many(names)
+    assert error.value.unmatched_names == ["Acme Pty Ltd", "Nobody"]
+    assert "'Acme Pty Ltd'" in str(error.value)
+    assert "'Nobody'" in str(error.value)
+
+    with pytest.raises(IndexError):
+        partial_match({"Payroll Name": "Nobody"}, organizations_df)
+    with pytest.raises(OrganizationMatchError) as error:
+        matcher.match("Nobody")
+    assert error.value.unmatched_names == ["Nobody"]
+    with pytest.raises(OrganizationMatchError):
+        matcher.first_match(names)
@@ -0,0 +1,79 @@
+import multiprocessing
+
+from app.metrics import MetricsRegistry
+
+
+def make_registry(directory):
+    registry = MetricsRegistry(str(directory))
+    runs = registry.counter("test_runs_total", "Runs.")
+    seconds = registry.histogram("test_seconds", "Durations.", buckets=(1, 10))
+    rss = registry.gauge("test_rss_bytes", "RSS.")
+    return registry, runs, seconds, rss
+
+
+def run_worker(directory, runs_count, duration):
+    registry, runs, seconds, rss = make_registry(directory)
+    for _ in range(runs_count):
+        runs.inc(outcome="succeeded")
+    seconds.observe(duration)
+    rss.set(100)
+    registry.flush()
+
+
+def start_workers(directory, jobs):
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=run_worker, args=(directory, *job)) for job in jobs]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    return [process.pid for process in processes]
+
+
+def samples(text):
+    return dict(line.rsplit(" ", 1) for line in text.splitlines() if not line.startswith("#"))
+
+
+def test_render_sums_all_worker_processes(tmp_path):
+    pids = start_workers(tmp_path, [(2, 0.5), (3, 5)])
+    registry, runs, seconds, rss = make_registry(tmp_path)
+    runs.inc(outcome="failed")
+
+    rendered = samples(registry.render())
+    assert rendered['test_runs_total{outcome="succeeded"}'] == "5"
+    assert rendered['test_runs_total{outcome="failed"}'] == "1"
+    assert rendered['test_seconds_bucket{le="1"}'] == "1"
+    assert rendered['test_seconds_bucket{le="10"}'] == "2"
+    assert rendered["test_seconds_count"] == "2"
+    assert rendered["test_seconds_sum"] == "5.5"
+    for pid in pids:
+        assert rendered[f'test_rss_bytes{{pid="{pid}"}}'] == "100"
+
+
+def test_exited_workers_keep_counters_but_not_gauges(tmp_path):
+    first, second = start_workers(tmp_path, [(2, 0.5), (3, 5)])
+    registry = make_registry(tmp_path)[0]
+    registry.mark_process_dead(first)
+    registry.mark_process_dead(second)
+    start_workers(tmp_path, [(1, 0.5)])
+
+    rendered = samples(registry.render())
+    assert rendered['test_runs_total{outcome="succeeded"}'] == "6"
+    assert rendered["test_seconds_count"] == "3"
+    assert f'test_rss_bytes{{pid="{first}"}}' not in rendered
+    assert f'test_rss_bytes{{pid="{second}"}}' not in rendered
+
+
+def test_clear_directory(tmp_path):
+    start_workers(tmp_path, [(2, 0.5)])
+    registry = make_registry(tmp_path)[0]
+    registry.clear_directory()
+    assert samples(registry.render()) == {}
+
+
+def test_without_directory_metrics_stay_in_process(tmp_path):
+    registry = MetricsRegistry()
+    registry.counter("test_runs_total", "Runs.").inc(outcome="succeeded")
+    registry.flush()
+    assert samples(registry.render()) == {'test_runs_total{outcome="succeeded"}': "1"}
+    assert list(tmp_path.iterdir()) == []
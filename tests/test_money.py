@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.line_store import round_2dp
+from app.money import format_cents, gst_cents, line_amount_cents, round_half_up_div
+from app.processor import DataProcessor
+
+
+@pytest.mark.parametrize("numerator, denominator, expected", [
+    (4, 10, 0),
+    (5, 10, 1),
+    (15, 10, 2),
+    (25, 10, 3),
+    (-5, 10, -1),
+    (-15, 10, -2),
+    (-4, 10, 0),
+    (0, 10, 0),
+    (1092675, 1000, 1093),
+])
+def test_round_half_up_div(numerator, denominator, expected):
+    assert round_half_up_div(numerator, denominator) == expected
+
+
+def test_round_half_up_div_arrays():
+    numerators = np.array([5, -5, 149, 150, -150], dtype=np.int64)
+    assert round_half_up_div(numerators, 100).tolist() == [0, 0, 1, 2, -2]
+
+
+@pytest.mark.parametrize("units, rate, expected", [
+    (1, 1092.675, 109268),
+    (7.5, 47.13, 35348),
+    (3.25, 64.61, 20998),
+    (0.5, 0.01, 1),
+    (38, 55.55, 211090),
+    (0, 99.99, 0),
+    (-7.5, 47.13, -35348),
+    (7.5, -47.13, -35348),
+    (-1, 1092.675, -109268),
+])
+def test_line_amount_cents_rounds_half_up(units, rate, expected):
+    assert line_amount_cents(np.array([units]), np.array([rate])).tolist() == [expected]
+
+
+def test_line_amount_cents_keeps_shape():
+    units = np.array([[1.0, 2.0], [0.5, 7.5]])
+    rates = np.array([[10.005, 1.0], [0.03, 47.13]])
+    amounts = line_amount_cents(units, rates)
+    assert amounts.dtype == np.int64
+    assert amounts.tolist() == [[1001, 200], [2, 35348]]
+
+
+@pytest.mark.parametrize("units, rate", [
+    (1.0, np.nan),
+    (0.0, np.nan),
+    (np.nan, 10.0),
+    (1.0, np.inf),
+    (-np.inf, 10.0),
+])
+def test_line_amount_cents_rejects_non_finite(units, rate):
+    with pytest.raises(ValueError):
+        line_amount_cents(np.array([units]), np.array([rate]))
+
+
+@pytest.mark.parametrize("subtotal, expected", [
+    (0, 0),
+    (1000, 100),
+    (1004, 100),
+    (1005, 101),
+    (1006, 101),
+    (-1005, -101),
+    (-1004, -100),
+    (109268, 10927),
+])
+def test_gst_cents(subtotal, expected):
+    assert gst_cents(subtotal) == expected
+    assert isinstance(gst_cents(np.int64(subtotal)), int)
+
+
+@pytest.mark.parametrize("cents, expected", [
+    (0, "0.00"),
+    (5, "0.05"),
+    (-5, "-0.05"),
+    (100, "1.00"),
+    (123450, "1234.50"),
+    (109268, "1092.68"),
+    (-1234, "-12.34"),
+    (np.int64(-109268), "-1092.68"),
+])
+def test_format_cents(cents, expected):
+    assert format_cents(cents) == expected
+
+
+def cost_centre_data(units, rates):
+    """
+    :return: Merged data of one cost centre with one "Normal Hourly (Qty)" -> "NT" pay item.
+    """
+    return pd.DataFrame({
+        "Employee No.": [1001 + position for position in range(len(units))],
+        "Last Name": ["Jones", "Brown", "Lee"][:len(units)],
+        "Given Names": ["Eve", "Ann", "Dan"][:len(units)],
+        "Cost Centre": "WGT-NOR",
+        "Payroll Name Selection": "Austunnel Pty Ltd - Weekly",
+        "Period End Date": "14/01/2024",
+        "Job Classification": "Miner",
+        "Normal Hourly (Qty)": units,
+        "NT": rates,
+    })
+
+
+def test_invoice_lines_bill_half_cents_up():
+    lines = DataProcessor().build_invoice_lines(cost_centre_data([1.0, -7.5], [1092.675, 47.13]), "WGT-NOR")
+    assert sorted(lines["Amount Cents"].tolist()) == [-35348, 109268]
+
+
+@pytest.mark.parametrize("rate", [np.nan, None])
+def test_invoice_lines_reject_missing_rates(rate):
+    data = cost_centre_data([7.5, 8.0], [47.13, rate])
+    with pytest.raises(ValueError) as error:
+        DataProcessor().build_invoice_lines(data, "WGT-NOR")
+    message = str(error.value)
+    assert "WGT-NOR" in message
+    assert "1002" in message
+    assert "Ann Brown" in message
+    assert "Normal Hourly (Qty)" in message
+    assert "'NT'" in message
+
+
+def test_invoice_lines_allow_missing_rates_without_units():
+    lines = DataProcessor().build_invoice_lines(cost_centre_data([7.5, 0.0], [47.13, np.nan]), "WGT-NOR")
+    assert sorted(lines["Amount Cents"].tolist()) == [0, 35348]
+
+
+def test_round_2dp_matches_csv_format():
+    values = pd.Series([0, 1, 3.25, 7.5, -7.5, 0.125, 0.375, 0.015, 0.025, 1.005, 2.675, 1092.675, -2.675,
+                        123456.789, np.nan, 1e-9, -1e-9])
+    rng = np.random.default_rng(0)
+    values = pd.concat([values, pd.Series(rng.uniform(-500, 500, 5000).round(3)),
+                        pd.Series(rng.uniform(0, 1e6, 5000))], ignore_index=True)
+    expected = values.map("{:.2f}".format).astype(float)
+    pd.testing.assert_series_equal(round_2dp(values), expected)
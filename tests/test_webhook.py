@@ -0,0 +1,149 @@
+import json
+import threading
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.webhook import WebhookSender
+
+
+class WebhookStub:
+    def __init__(self, statuses):
+        """
+        Local HTTP server standing in for the webhook.
+
+        :param statuses: Response status codes for successive requests; the
+            last one is repeated once they run out.
+        """
+        self.statuses = list(statuses)
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                stub.requests.append((dict(self.headers), body))
+                status = stub.statuses[min(len(stub.requests), len(stub.statuses)) - 1]
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/hook"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def parse_multipart(headers, body):
+    """
+    :return: List of (field name, file name, payload bytes) of the parts.
+    """
+    message = BytesParser(policy=HTTP).parsebytes(
+        f"Content-Type: {headers['Content-Type']}\r\n\r\n".encode("ascii") + body
+    )
+    assert message.is_multipart()
+    return [
+        (part.get_param("name", header="content-disposition"), part.get_filename(),
+         part.get_payload(decode=True))
+        for part in message.iter_parts()
+    ]
+
+
+@pytest.fixture
+def pdfs(tmp_path):
+    files = []
+    for name, content in [("A_invoice.pdf", b"%PDF-a"), ("B_invoice.pdf", b"%PDF-b" * 1000)]:
+        path = tmp_path / name
+        path.write_bytes(content)
+        files.append((name, str(path), "application/pdf"))
+    return files
+
+
+records = [{"Cost Centre": "A", "Total": 10.0}, {"Cost Centre": "B", "Total": 20.0}]
+
+
+def test_multipart_body_parses(pdfs):
+    with WebhookStub([200]) as stub:
+        sender = WebhookSender(stub.url, backoff=0)
+        response = sender.send_data_to_webhook({"data": records}, {"files": pdfs}, run_id="run1")
+
+    assert response["batches"][0]["success"]
+    assert len(stub.requests) == 1
+    headers, body = stub.requests[0]
+    assert headers["Idempotency-Key"] == "run1-0"
+    parts = parse_multipart(headers, body)
+    assert [(name, file_name) for name, file_name, _ in parts] == [
+        ("fulldata", None), ("file_data", "A_invoice.pdf"), ("file_data", "B_invoice.pdf"),
+    ]
+    assert json.loads(parts[0][2]) == {"data": records, "idempotency_key": "run1-0"}
+    assert parts[1][2] == b"%PDF-a"
+    assert parts[2][2] == b"%PDF-b" * 1000
+
+
+def test_batches_have_distinct_keys(pdfs):
+    with WebhookStub([200]) as stub:
+        sender = WebhookSender(stub.url, max_batch_bytes=100, backoff=0)
+        response = sender.send_data_to_webhook({"data": records}, {"files": pdfs}, run_id="run1")
+
+    assert [batch["idempotency_key"] for batch in response["batches"]] == ["run1-0", "run1-1"]
+    assert [headers["Idempotency-Key"] for headers, _ in stub.requests] == ["run1-0", "run1-1"]
+
+
+def test_retries_server_errors_with_the_same_key(pdfs):
+    with WebhookStub([500, 503, 200]) as stub:
+        sender = WebhookSender(stub.url, max_retries=3, backoff=0)
+        response = sender.send_data_to_webhook({"data": records}, {"files": pdfs}, run_id="run1")
+
+    status = response["batches"][0]
+    assert status["success"]
+    assert status["attempts"] == 3
+    assert len(stub.requests) == 3
+    assert {headers["Idempotency-Key"] for headers, _ in stub.requests} == {"run1-0"}
+    # Every attempt sends the complete body again
+    assert len({body for _, body in stub.requests}) == 1
+
+
+def test_gives_up_after_max_retries(pdfs):
+    with WebhookStub([500]) as stub:
+        sender = WebhookSender(stub.url, max_retries=2, backoff=0)
+        response = sender.send_data_to_webhook({"data": records}, {"files": pdfs}, run_id="run1")
+
+    status = response["batches"][0]
+    assert not status["success"]
+    assert status["status_code"] == 500
+    assert len(stub.requests) == 3
+    assert response["message"].startswith("Failed to send data to the webhook: 1 of 1 batches failed")
+
+
+@pytest.mark.parametrize("code", [400, 404, 422])
+def test_client_errors_are_not_retried(pdfs, code):
+    with WebhookStub([code, 200]) as stub:
+        sender = WebhookSender(stub.url, max_retries=3, backoff=0)
+        response = sender.send_data_to_webhook({"data": records}, {"files": pdfs}, run_id="run1")
+
+    status = response["batches"][0]
+    assert not status["success"]
+    assert status["status_code"] == code
+    assert status["attempts"] == 1
+    assert len(stub.requests) == 1
+
+
+def test_rate_limit_is_retried(pdfs):
+    with WebhookStub([429, 200]) as stub:
+        sender = WebhookSender(stub.url, max_retries=3, backoff=0)
+        response = sender.send_data_to_webhook({"data": records}, {"files": pdfs}, run_id="run1")
+
+    assert response["batches"][0]["success"]
+    assert len(stub.requests) == 2